@@ -8,9 +8,16 @@ This is the :mod:`atelier` package.
 
    invlib
    invlib.utils
+   invlib.doccache
    invlib.tasks
+   daemon
+   history
    jarbuilder
+   profiler
    projects
+   runner
+   setupreader
+   taskd
    test
    utils
    sphinxconf
@@ -18,9 +25,11 @@ This is the :mod:`atelier` package.
 
 """
 
-import setuptools  # try to avoid "Distutils was imported before Setuptools"
+from . import profiler
 
-from .setup_info import SETUP_INFO
+with profiler.phase('import atelier'):
+    import setuptools  # try to avoid "Distutils was imported before Setuptools"
+    from .setup_info import SETUP_INFO
 
 __version__ = SETUP_INFO['version']
 
@@ -0,0 +1,264 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2026 Rumma & Ko Ltd
+# License: BSD, see LICENSE for more details.
+
+"""
+The workspace state daemon :cmd:`atelierd`.
+
+The daemon keeps the git status and the cached metadata (see
+:meth:`atelier.projects.Project.get_cached_info`) of all registered
+projects in memory and answers queries over a Unix socket
+(:xfile:`~/.atelier/atelierd.sock`).  It watches the root directories of the
+projects using inotify when the optional `inotify_simple
+<https://pypi.org/project/inotify-simple/>`__ package is installed,
+otherwise it polls them regularly.
+
+Every query is a JSON object on a single line, every answer as well.
+
+>>> import os
+>>> from atelier.daemon import Workspace
+>>> ws = Workspace([])
+>>> ws.handle({'query': 'ping'}) == {'pid': os.getpid()}
+True
+>>> ws.handle({'query': 'status', 'root_dir': '/nowhere'})
+{'error': 'Unknown project /nowhere'}
+>>> ws.handle({'query': 'foo'})
+{'error': 'Unknown query foo'}
+
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+from atelier.projects import load_projects, git_status, PRUNE_DIRS
+
+socket_file = '~/.atelier/atelierd.sock'
+
+POLL_INTERVAL = 10
+"""Seconds between two refreshes of all projects when polling."""
+
+FULL_REFRESH_INTERVAL = 300
+"""Seconds between two refreshes of all projects when using inotify."""
+
+QUERY_TIMEOUT = 1.0
+"""Seconds to wait for an answer from the daemon."""
+
+def get_socket_file():
+    return os.path.expanduser(socket_file)
+
+
+def query(name, **kwargs):
+    """
+    Send the query `name` (with the given keyword arguments) to
+    :cmd:`atelierd` and return its answer (a dict), or `None` if the daemon
+    is not running.
+    """
+    fn = get_socket_file()
+    if not os.path.exists(fn):
+        return None
+    kwargs.update(query=name)
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(QUERY_TIMEOUT)
+    try:
+        s.connect(fn)
+        s.sendall(json.dumps(kwargs).encode() + b"\n")
+        with s.makefile('rb') as f:
+            line = f.readline()
+    except OSError:
+        return None
+    finally:
+        s.close()
+    if not line:
+        return None
+    return json.loads(line.decode())
+
+
+class Workspace(object):
+    """
+    The in-memory model of the given projects.
+    """
+
+    def __init__(self, projects, jobs=None):
+        self.projects = {str(p.root_dir): p for p in projects}
+        self.jobs = jobs
+        self.model = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def refresh(self, root_dir):
+        """Recompute the state of the project in `root_dir`."""
+        prj = self.projects[root_dir]
+        state = dict(nickname=prj.nickname)
+        try:
+            # the daemon itself never executes the files of a project
+            info = prj.read_cache_file() or prj.read_info_in_subprocess()
+            if info is None:
+                raise Exception("Failed to load {}".format(root_dir))
+            state.update(info=info)
+            if info['config']['revision_control_system'] == 'git':
+                state.update(status=git_status(prj.root_dir, cached=False))
+            else:
+                state.update(status='')
+        except Exception as e:
+            state.update(error=str(e))
+        with self.lock:
+            self.model[root_dir] = state
+
+    def refresh_all(self):
+        """Recompute the state of all projects."""
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            list(executor.map(self.refresh, self.projects))
+
+    def handle(self, request):
+        """Return the answer to the given query."""
+        name = request.get('query')
+        if name == 'ping':
+            return dict(pid=os.getpid())
+        if name == 'list':
+            with self.lock:
+                return dict(projects=dict(self.model))
+        if name in ('status', 'info'):
+            root_dir = request.get('root_dir')
+            with self.lock:
+                state = self.model.get(root_dir)
+            if state is None:
+                return dict(error="Unknown project {}".format(root_dir))
+            if name not in state:
+                return dict(error=state.get('error'))
+            return {name: state[name]}
+        if name == 'refresh':
+            self.refresh_all()
+            return dict()
+        if name == 'stop':
+            if self.server is not None:
+                threading.Thread(target=self.server.shutdown).start()
+            return dict()
+        return dict(error="Unknown query {}".format(name))
+
+    def poll(self, interval):
+        """Refresh all projects every `interval` seconds."""
+        while True:
+            time.sleep(interval)
+            self.refresh_all()
+
+    def watch(self, interval=POLL_INTERVAL):
+        """
+        Refresh the projects when inotify reports a change in their
+        directories, and all projects every :data:`FULL_REFRESH_INTERVAL`
+        seconds.
+
+        Like :func:`atelier.projects.discover_projects`, the watcher skips
+        the directories named in :data:`atelier.projects.PRUNE_DIRS` (except
+        the top level of :file:`.git`) and virtual environments.  When
+        inotify fails (e.g. because the maximum number of watches has been
+        reached), fall back to polling every `interval` seconds.
+        """
+        flags = inotify_simple.flags
+        mask = (flags.CREATE | flags.DELETE | flags.MODIFY | flags.ATTRIB |
+                flags.MOVED_FROM | flags.MOVED_TO | flags.CLOSE_WRITE)
+        inotify = inotify_simple.INotify()
+        watches = {}
+
+        def add_watches(root_dir, top):
+            if os.path.basename(top) in PRUNE_DIRS - {'.git'}:
+                return
+            for dirpath, dirnames, filenames in os.walk(top):
+                if os.path.basename(dirpath) == '.git':
+                    # changes of the index and HEAD are enough
+                    dirnames[:] = []
+                elif 'pyvenv.cfg' in filenames:
+                    dirnames[:] = []
+                    continue
+                else:
+                    dirnames[:] = [d for d in dirnames
+                                   if d == '.git' or d not in PRUNE_DIRS]
+                try:
+                    wd = inotify.add_watch(dirpath, mask)
+                except FileNotFoundError:
+                    continue
+                watches[wd] = (root_dir, dirpath)
+
+        try:
+            for root_dir in self.projects:
+                add_watches(root_dir, root_dir)
+            last_refresh = time.monotonic()
+            while True:
+                changed = set()
+                for event in inotify.read(timeout=1000, read_delay=200):
+                    root_dir, dirpath = watches.get(event.wd, (None, None))
+                    if root_dir is None:
+                        continue
+                    changed.add(root_dir)
+                    if event.mask & flags.ISDIR and event.mask & (
+                            flags.CREATE | flags.MOVED_TO):
+                        add_watches(
+                            root_dir, os.path.join(dirpath, event.name))
+                if time.monotonic() - last_refresh > FULL_REFRESH_INTERVAL:
+                    self.refresh_all()
+                    last_refresh = time.monotonic()
+                else:
+                    for root_dir in changed:
+                        self.refresh(root_dir)
+        except OSError as e:
+            print("Cannot use inotify ({}), polling instead.".format(e))
+            inotify.close()
+        self.poll(interval)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            answer = self.server.workspace.handle(json.loads(line.decode()))
+        except Exception as e:
+            answer = dict(error=str(e))
+        self.wfile.write(json.dumps(answer).encode() + b"\n")
+
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(jobs=None, interval=POLL_INTERVAL, polling=False):
+    """
+    Run :cmd:`atelierd` until it receives a `stop` query.
+    """
+    if query('ping') is not None:
+        raise Exception("atelierd is already running")
+    fn = get_socket_file()
+    if os.path.exists(fn):
+        os.remove(fn)
+    # don't let our git status calls write to the index
+    os.environ['GIT_OPTIONAL_LOCKS'] = '0'
+    ws = Workspace(load_projects(), jobs)
+    ws.refresh_all()
+    if polling or inotify_simple is None:
+        target, args = ws.poll, (interval,)
+    else:
+        target, args = ws.watch, (interval,)
+    threading.Thread(target=target, args=args, daemon=True).start()
+    umask = os.umask(0o077)
+    try:
+        server = Server(fn, RequestHandler)
+    finally:
+        os.umask(umask)
+    server.workspace = ws
+    ws.server = server
+    print("atelierd is watching {} projects ({}), socket is {}".format(
+        len(ws.projects), target.__name__, fn))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(fn)
@@ -0,0 +1,262 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2026 Rumma & Ko Ltd
+# License: BSD, see LICENSE for more details.
+
+"""
+Defines the :class:`History` class, a small SQLite database where
+:cmd:`per_project` remembers how long a command took in each project, the
+state of each project's working tree after the last successful run of a
+command, and a journal of the last runs.
+
+>>> from atelier.history import History
+>>> h = History(":memory:")
+>>> for i, d in enumerate([3, 1, 2, 10, 4]):
+...     h.add_duration("inv  test", "/p/a", "a", i, d)
+>>> h.add_duration("inv test", "/p/b", "b", 0, 7)
+>>> h.add_duration("inv test", "/p/b", "b", 0, 99, returncode=1)
+>>> h.get_estimates("inv test")
+{'/p/a': 3.0, '/p/b': 7.0}
+>>> for row in h.get_stats(['inv', 'test']):
+...     print(row)
+('a', 5, 3.0, 10.0)
+('b', 1, 7.0, 7.0)
+
+>>> h.set_fingerprint("inv test", "/p/a", "1234")
+>>> h.get_fingerprint("inv test", "/p/a")
+'1234'
+>>> print(h.get_fingerprint("inv prep", "/p/a"))
+None
+
+>>> class P:
+...     def __init__(self, nickname):
+...         self.nickname = nickname
+...         self.root_dir = "/p/" + nickname
+>>> run_id = h.start_run(['inv', 'test'], [P('a'), P('b'), P('c')])
+>>> h.set_state(run_id, "/p/a", "ok")
+>>> h.set_state(run_id, "/p/b", "failed")
+>>> run_id, argv, entries = h.get_last_run()
+>>> argv
+['inv', 'test']
+>>> for e in entries:
+...     print(e)
+('/p/a', 'a', 'ok')
+('/p/b', 'b', 'failed')
+('/p/c', 'c', 'pending')
+
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+history_file = '~/.atelier/history.sqlite'
+
+KEEP_RUNS = 20
+"""The number of runs to keep in the journal."""
+
+
+def normalize_command(cmd):
+    """
+    Return the given command (a string or a list of strings) as a string
+    with normalized whitespace.
+
+    >>> normalize_command(['inv', 'prep', ' test'])
+    'inv prep test'
+    """
+    if not isinstance(cmd, str):
+        cmd = ' '.join(cmd)
+    return ' '.join(cmd.split())
+
+
+def percentile(values, p):
+    """
+    Return the `p`-th percentile of the given list of numbers using the
+    nearest-rank method.
+
+    >>> percentile([1, 2, 3, 4], 50)
+    2
+    >>> percentile([1, 2, 3, 4], 95)
+    4
+    """
+    values = sorted(values)
+    k = max(0, -(-len(values) * p // 100) - 1)
+    return values[int(k)]
+
+
+class History(object):
+    """
+    A database of the durations of the commands run by :cmd:`per_project`,
+    of the fingerprints of the projects after their last successful run, and
+    a journal of the last :data:`KEEP_RUNS` runs.
+
+    `filename` defaults to :xfile:`~/.atelier/history.sqlite`.
+
+    """
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.expanduser(history_file)
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS durations ("
+            "command TEXT, root_dir TEXT, nickname TEXT, "
+            "started REAL, duration REAL, returncode INTEGER)")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS durations_command "
+            "ON durations (command, root_dir)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS successes ("
+            "command TEXT, root_dir TEXT, fingerprint TEXT, "
+            "PRIMARY KEY (command, root_dir))")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id INTEGER PRIMARY KEY, command TEXT, argv TEXT, started REAL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS run_projects ("
+            "run_id INTEGER, position INTEGER, root_dir TEXT, "
+            "nickname TEXT, state TEXT)")
+        self.conn.commit()
+
+    def add_duration(self, cmd, root_dir, nickname, started, duration,
+                     returncode=0):
+        """Store the duration of one execution of `cmd` in a project."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO durations VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_command(cmd), str(root_dir), nickname, started,
+                 duration, returncode))
+            self.conn.commit()
+
+    def add_run(self, run):
+        """Store the duration of a :class:`atelier.runner.ProjectRun` and, if
+        it was successful, the fingerprint its project had when the run
+        started (see :attr:`atelier.runner.ProjectRun.fingerprint`)."""
+        if run.duration is None:
+            return
+        self.add_duration(run.cmd, run.prj.root_dir, run.prj.nickname,
+                          run.started, run.duration, run.returncode)
+        if run.returncode == 0:
+            if run.fingerprint is not None:
+                self.set_fingerprint(
+                    run.cmd, run.prj.root_dir, run.fingerprint)
+
+    def get_durations(self, cmd):
+        """
+        Return a dict mapping the root directory of each project to the list
+        of durations of all successful executions of `cmd` in that project.
+        """
+        rv = dict()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT root_dir, duration FROM durations "
+                "WHERE command = ? AND returncode = 0 ORDER BY started",
+                (normalize_command(cmd),)).fetchall()
+        for root_dir, duration in rows:
+            rv.setdefault(root_dir, []).append(duration)
+        return rv
+
+    def get_estimates(self, cmd):
+        """
+        Return a dict mapping the root directory of each project to the
+        expected duration (the median of past durations) of `cmd` in that
+        project.
+        """
+        return {k: float(percentile(v, 50))
+                for k, v in self.get_durations(cmd).items()}
+
+    def get_stats(self, cmd):
+        """
+        Yield a tuple `(nickname, count, p50, p95)` for each project in which
+        `cmd` has been run successfully.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT nickname, duration FROM durations "
+                "WHERE command = ? AND returncode = 0 ORDER BY rowid",
+                (normalize_command(cmd),)).fetchall()
+        durations = dict()
+        for nickname, duration in rows:
+            durations.setdefault(nickname, []).append(duration)
+        for nickname, values in durations.items():
+            yield (nickname, len(values), float(percentile(values, 50)),
+                   float(percentile(values, 95)))
+
+    def set_fingerprint(self, cmd, root_dir, fingerprint):
+        """Store the fingerprint of a project after a successful execution of
+        `cmd`."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO successes VALUES (?, ?, ?)",
+                (normalize_command(cmd), str(root_dir), fingerprint))
+            self.conn.commit()
+
+    def get_fingerprint(self, cmd, root_dir):
+        """Return the fingerprint of a project after the last successful
+        execution of `cmd`, or `None`."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fingerprint FROM successes "
+                "WHERE command = ? AND root_dir = ?",
+                (normalize_command(cmd), str(root_dir))).fetchone()
+        if row is not None:
+            return row[0]
+
+    def start_run(self, cmd, projects):
+        """
+        Add a new run of `cmd` to the journal, with all given projects in
+        state "pending".  Return the id of the new run.
+        """
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT INTO runs (command, argv, started) VALUES (?, ?, ?)",
+                (normalize_command(cmd), json.dumps(list(cmd)), time.time()))
+            run_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO run_projects VALUES (?, ?, ?, ?, ?)",
+                [(run_id, i, str(prj.root_dir), prj.nickname, 'pending')
+                 for i, prj in enumerate(projects)])
+            self.conn.execute(
+                "DELETE FROM runs WHERE id <= ?", (run_id - KEEP_RUNS,))
+            self.conn.execute(
+                "DELETE FROM run_projects WHERE run_id <= ?",
+                (run_id - KEEP_RUNS,))
+            self.conn.commit()
+        return run_id
+
+    def set_state(self, run_id, root_dir, state):
+        """Set the state of a project in a journaled run.  Known states are
+        "pending", "ok", "failed" and "cancelled"."""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE run_projects SET state = ? "
+                "WHERE run_id = ? AND root_dir = ?",
+                (state, run_id, str(root_dir)))
+            self.conn.commit()
+
+    def get_last_run(self, cmd=None):
+        """
+        Return a tuple `(run_id, argv, entries)` describing the last
+        journaled run (of `cmd` if given), or `None` if there is no such run.
+        `entries` is a list of `(root_dir, nickname, state)` tuples in the
+        original order of the projects.
+        """
+        with self.lock:
+            if cmd:
+                row = self.conn.execute(
+                    "SELECT id, argv FROM runs WHERE command = ? "
+                    "ORDER BY id DESC LIMIT 1",
+                    (normalize_command(cmd),)).fetchone()
+            else:
+                row = self.conn.execute(
+                    "SELECT id, argv FROM runs "
+                    "ORDER BY id DESC LIMIT 1").fetchone()
+            if row is None:
+                return None
+            entries = self.conn.execute(
+                "SELECT root_dir, nickname, state FROM run_projects "
+                "WHERE run_id = ? ORDER BY position", (row[0],)).fetchall()
+        return row[0], json.loads(row[1]), entries
@@ -20,6 +20,7 @@ from invoke import Collection
 from pathlib import Path
 
 import atelier
+from atelier import profiler
 
 
 def setup_from_tasks(
@@ -54,7 +55,8 @@ def setup_from_tasks(
         raise Exception("No such file: %s" % tasks_file)
     # print("20180428 setup_from_tasks() : {}".format(root_dir))
 
-    from atelier.invlib import tasks
+    with profiler.phase('import atelier.invlib.tasks'):
+        from atelier.invlib import tasks
     from atelier.projects import get_project_from_tasks
     prj = get_project_from_tasks(tasks_file.parent)
 
@@ -65,10 +67,14 @@ def setup_from_tasks(
         prj.config.update(kwargs)
 
     if settings_module_name is not None:
+        # a Django project cannot share its process with other projects
+        if 'isolated_tasks' not in kwargs:
+            prj.config.update(isolated_tasks=True)
         os.environ['DJANGO_SETTINGS_MODULE'] = settings_module_name
-        from django.conf import settings
-        prj.config.update(
-            languages=[lng.name for lng in settings.SITE.languages])
+        with profiler.phase('django settings', prj.nickname):
+            from django.conf import settings
+            prj.config.update(
+                languages=[lng.name for lng in settings.SITE.languages])
 
     if isinstance(main_package, str):
         main_package = import_module(main_package)
@@ -0,0 +1,184 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2026 Rumma & Ko Ltd
+# License: BSD, see LICENSE for more details.
+
+"""
+A shared cache for the output of :cmd:`inv bd`.
+
+The cache is a directory (see :envvar:`doc_cache_dir`), which may be on a
+network file system shared by several developers and a CI server.  It
+contains one archive per build, named after a key that is computed from
+everything the build depends on: the :cmd:`sphinx-build` command line
+(including the language), the content of the source files, and the versions
+of Sphinx, the theme and the extensions.  The key doesn't depend on where
+the project is checked out.
+
+When the cache grows above its maximum size (see :envvar:`doc_cache_size`),
+the least recently used archives are removed.
+
+>>> import tempfile
+>>> from pathlib import Path
+>>> from atelier.invlib.doccache import DocCache, make_key
+>>> tmp = Path(tempfile.mkdtemp())
+>>> key = make_key(['sphinx-build', str(tmp / 'docs' / '.build')],
+...     {str(tmp / 'docs' / 'index.rst'): '1234'}, tmp, {'sphinx': '7.0'})
+>>> key == make_key(['sphinx-build', '/elsewhere/docs/.build'],
+...     {'/elsewhere/docs/index.rst': '1234'}, '/elsewhere', {'sphinx': '7.0'})
+True
+>>> build_dir = tmp / 'build'
+>>> build_dir.mkdir()
+>>> _ = (build_dir / 'index.html').write_text("Hello")
+>>> cache = DocCache(tmp / 'cache')
+>>> cache.restore(key, build_dir)
+False
+>>> cache.store(key, build_dir)
+>>> _ = (build_dir / 'index.html').write_text("Changed")
+>>> cache.restore(key, build_dir)
+True
+>>> (build_dir / 'index.html').read_text()
+'Hello'
+>>> DocCache(tmp / 'cache', max_size=0).evict()
+>>> cache.restore(key, build_dir)
+False
+
+"""
+
+import os
+import sys
+import json
+import shutil
+import tarfile
+import hashlib
+import tempfile
+from pathlib import Path
+from importlib import metadata
+
+
+def get_version(name):
+    """Return the version of the installed distribution that provides the
+    top-level package of the given module name, or `None`."""
+    name = name.split('.')[0]
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def make_key(args, hashes, root_dir, versions):
+    """
+    Return the cache key of a build with the given command line `args`,
+    the given `hashes` of the source files (a dict mapping file names to
+    hashes of their content) and the given `versions` of the tools.  File
+    names below `root_dir` are made relative to it.
+    """
+    root = str(root_dir) + os.sep
+
+    def rel(s):
+        s = str(s)
+        if s.startswith(root):
+            return s[len(root):]
+        return s
+
+    data = dict(
+        args=[rel(a) for a in args],
+        files=sorted([(rel(k), v) for k, v in hashes.items()]),
+        versions=versions, python=sys.version_info[:2])
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+class DocCache(object):
+    """
+    A build cache in the directory `cache_dir`, holding at most `max_size`
+    megabytes (or any size if `max_size` is `None`).
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        self.cache_dir = Path(os.path.expanduser(str(cache_dir)))
+        self.max_size = max_size
+
+    def get_file(self, key):
+        return self.cache_dir / key[:2] / (key + '.tar.gz')
+
+    def restore(self, key, build_dir, exclude=()):
+        """
+        Replace the content of `build_dir` (except the names in `exclude`)
+        by the archive stored under `key`.  Return `False` if there is no
+        such archive.
+        """
+        fn = self.get_file(key)
+        if not fn.exists():
+            return False
+        build_dir = Path(build_dir)
+        build_dir.mkdir(parents=True, exist_ok=True)
+        for p in build_dir.iterdir():
+            if p.name in exclude:
+                continue
+            if p.is_dir() and not p.is_symlink():
+                shutil.rmtree(str(p))
+            else:
+                p.unlink()
+        try:
+            with tarfile.open(str(fn)) as tar:
+                if hasattr(tarfile, 'data_filter'):
+                    tar.extractall(str(build_dir), filter='data')
+                else:
+                    tar.extractall(str(build_dir))
+        except (OSError, tarfile.TarError) as e:
+            print("Removing broken cache entry {} ({})".format(fn, e))
+            fn.unlink()
+            return False
+        try:
+            os.utime(str(fn))  # mark as recently used
+        except OSError:
+            pass
+        return True
+
+    def store(self, key, build_dir, exclude=()):
+        """
+        Store the content of `build_dir` (except the names in `exclude`)
+        under `key`, then remove the least recently used archives if the
+        cache has become too big.
+        """
+        fn = self.get_file(key)
+        fn.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=str(fn.parent))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with tarfile.open(fileobj=f, mode='w:gz') as tar:
+                    for p in sorted(Path(build_dir).iterdir()):
+                        if p.name not in exclude:
+                            tar.add(str(p), arcname=p.name)
+            # mkstemp() creates a private file, but the cache may be shared
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp, 0o666 & ~umask)
+            os.replace(tmp, str(fn))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used archives until the cache is
+        smaller than its maximum size."""
+        if self.max_size is None:
+            return
+        entries = []
+        total = 0
+        for fn in self.cache_dir.glob('*/*.tar.gz'):
+            try:
+                st = fn.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, fn))
+            total += st.st_size
+        entries.sort()
+        limit = self.max_size * 1024 * 1024
+        while entries and total > limit:
+            mtime, size, fn = entries.pop(0)
+            try:
+                fn.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -6,6 +6,11 @@ This is the module that defines the invoke namespace.
 
 It is imported by :func:`atelier.invlib.setup_from_tasks` which passes
 it to :func:`invoke.Collection.from_module`.
+
+This module is imported by every :cmd:`inv` command, so it imports only
+what is needed for defining the tasks.  Dependencies that are used by only
+some tasks (like :mod:`babel`, :mod:`rstgen` or GitPython) are imported
+inside these tasks.
 """
 
 import os
@@ -17,9 +22,6 @@ from datetime import timedelta
 import shutil
 
 from atelier.utils import i2d
-from babel.dates import format_date
-import rstgen
-from atelier.projects import load_projects
 from pathlib import Path
 
 try:
@@ -208,6 +210,7 @@ def write_readme(ctx):
     #         msg = "SETUP_INFO for {0} has no key '{1}'"
     #         raise Exception(msg.format(env.current_project, k))
 
+    import rstgen
     title = rstgen.header(1, "The ``{}`` package".format(info['name']))
 
     txt = """\
@@ -226,7 +229,7 @@ def write_readme(ctx):
 
 
 @task(write_readme, name='bd')
-def build_docs(ctx, only=None):
+def build_docs(ctx, only=None, force=False):
     """Build docs. Build all Sphinx HTML doctrees for this project. """
     # print("Build docs for {}".format(atelier.current_project))
 
@@ -239,6 +242,8 @@ def build_docs(ctx, only=None):
         for tree in atelier.current_project.get_doc_trees():
             if tree.src_path:
                if only is None or tree.rel_path == only:
+                    if force:
+                        tree.remove_manifests()
                     tree.build_docs(ctx)
 
 
@@ -438,6 +443,8 @@ def edit_blog_entry(ctx, today=None):
     today = get_current_date(today)
     entry = get_blog_entry(ctx, today)
     if not entry.path.exists():
+        from babel.dates import format_date
+        import rstgen
         if ctx.languages is None:
             # txt = today.strftime(ctx.long_date_format)
             lng = 'en'
@@ -620,6 +627,7 @@ def update_catalog_code(ctx):
 #     """List your projects."""
 
 def git_projects():
+    from atelier.projects import load_projects
     for prj in load_projects():
         prj.load_info()
         if prj.config['revision_control_system'] == 'git':
@@ -630,6 +638,7 @@ def git_projects():
 def commited_today(ctx, today=None):
     """Print all today's commits to stdout."""
     from git import Repo
+    import rstgen
 
     list_options = dict()
     if True:
@@ -6,6 +6,14 @@
 
 """
 
+import os
+import sys
+import json
+import hashlib
+import selectors
+import traceback
+from pathlib import Path
+
 from invoke.exceptions import Exit
 
 from atelier.utils import confirm, cd
@@ -21,6 +29,96 @@ def must_exist(p):
         raise Exception("No such file: %s" % p.absolute())
 
 
+SPHINX_ENGINES = ('process', 'inprocess')
+
+MANIFEST_FILE = '.atelier-manifest.json'
+"""The name of the file in each build directory where :cmd:`inv bd` records
+what the last successful build was made from."""
+
+
+class WarningCollector(object):
+    """A stream that writes to another stream and remembers everything that
+    was written to it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+        return self.stream.write(text)
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def sphinx_main(args):
+    """
+    Run the given :cmd:`sphinx-build` command line in the current process.
+    Return a tuple `(exit_code, warnings)` where `warnings` is the text that
+    Sphinx wrote to its warning stream.
+    """
+    from sphinx import locale
+    from sphinx.cmd.build import build_main
+    # Sphinx caches its own translations per process and would otherwise add
+    # the messages of a new language as a fallback to those of the previous
+    # one.
+    locale.translators.clear()
+    collector = WarningCollector(sys.stderr)
+    old_stderr = sys.stderr
+    sys.stderr = collector
+    try:
+        rv = build_main([str(a) for a in args[1:]])
+    except SystemExit as e:
+        rv = e.code if isinstance(e.code, int) else 1
+    finally:
+        sys.stderr = old_stderr
+    return rv, collector.getvalue()
+
+
+def fork_sphinx_build(engine, args, chdir):
+    """
+    Run the given :cmd:`sphinx-build` command line in a child process, either
+    by forking this process or by running a new :cmd:`sphinx-build` process.
+    Return the pid of the child and a file descriptor from which to read its
+    output.
+    """
+    r, w = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        rv = 1
+        try:
+            os.close(r)
+            os.dup2(w, 1)
+            os.dup2(w, 2)
+            os.chdir(str(chdir))
+            if engine == 'inprocess':
+                rv = sphinx_main(args)[0]
+            else:
+                os.execvp(args[0], [str(a) for a in args])
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(rv)
+    os.close(w)
+    return pid, r
+
+
+def get_sphinx_engine(ctx):
+    engine = ctx.sphinx_engine
+    if engine not in SPHINX_ENGINES:
+        raise Exception("Invalid sphinx_engine {!r} (must be one of {})".format(
+            engine, ', '.join(SPHINX_ENGINES)))
+    return engine
+
+
 def run_cmd(ctx, chdir, args):
     cmd = ' '.join(map(str, args))
     print("Invoke {}".format(cmd))
@@ -66,6 +164,14 @@ class DocTree(object):
     def build_docs(self, ctx, *cmdline_args):
         raise NotImplementedError()
 
+    def remove_manifests(self):
+        """Remove the manifests of all languages so that the next
+        :cmd:`inv bd` builds this doctree even if nothing has changed."""
+        if self.out_path is None or not self.out_path.exists():
+            return
+        for fn in self.out_path.glob('**/' + MANIFEST_FILE):
+            fn.unlink()
+
     def publish_docs(self, ctx):
         # build_dir = docs_dir / ctx.build_dir_name
         if self.src_path is None:
@@ -116,13 +222,18 @@ class SphinxTree(DocTree):
 
         http://www.sphinx-doc.org/en/stable/invocation.html#invocation-of-sphinx-build
 
+    .. attribute:: warnings
 
+        A dict mapping a language code (or `None` for the main language) to
+        the warnings reported by the last in-process build (see
+        :envvar:`sphinx_engine`) of that language.
 
     """
     has_intersphinx = True
 
     def __init__(self, prj, src_path):
         super(SphinxTree, self).__init__(prj, src_path)
+        self.warnings = dict()
         if self.src_path is None:
             return
 
@@ -153,12 +264,71 @@ class SphinxTree(DocTree):
         builder = 'html'
         if ctx.use_dirhtml:
             builder = 'dirhtml'
-        self.sphinx_build(ctx, builder, docs_dir, cmdline_args)
+        hashes = self.get_source_hashes()
+        self.sphinx_build(ctx, builder, docs_dir, cmdline_args, hashes=hashes)
         self.load_conf()
         translated_languages = self.conf_globals.get('translated_languages', [])
-        for lng in translated_languages:
-            self.sphinx_build(ctx, builder, docs_dir, cmdline_args, lng)
+        failures = self.build_translations(
+            ctx, builder, docs_dir, cmdline_args, translated_languages, hashes)
         self.sync_docs_data(ctx, docs_dir)
+        if failures:
+            raise Exit("Sphinx failed for {} in {}".format(
+                ', '.join(failures), docs_dir))
+
+    def build_translations(self, ctx, builder, docs_dir, cmdline_args,
+                           languages, hashes=None):
+        """
+        Run :cmd:`sphinx-build` for each of the given languages, each in its
+        own process and up to :envvar:`doc_build_jobs` of them at the same
+        time.  Print the output of each build when it has finished.  Return
+        a dict mapping each language whose build failed to its exit code.
+
+        If `hashes` (see :meth:`get_source_hashes`) is given, skip the
+        languages whose output is up to date and record a manifest after
+        each successful build.
+        """
+        if self.out_path is None or not languages:
+            return {}
+        engine = get_sphinx_engine(ctx)
+        jobs = ctx.doc_build_jobs or len(languages)
+        pending = list(languages)
+        running = dict()
+        failures = dict()
+        sel = selectors.DefaultSelector()
+        while pending or running:
+            while pending and len(running) < jobs:
+                lng = pending.pop(0)
+                args, build_dir = self.get_sphinx_args(
+                    ctx, builder, cmdline_args, lng)
+                manifest = self.make_manifest(args, hashes)
+                if self.is_up_to_date(build_dir, manifest):
+                    continue
+                if self.restore_from_cache(ctx, build_dir, manifest, lng):
+                    continue
+                pid, fd = fork_sphinx_build(engine, args, docs_dir)
+                running[fd] = (lng, args, pid, [], build_dir, manifest)
+                sel.register(fd, selectors.EVENT_READ)
+            if not running:
+                break
+            for key, events in sel.select():
+                data = os.read(key.fd, 65536)
+                if data:
+                    running[key.fd][3].append(data)
+                    continue
+                sel.unregister(key.fd)
+                os.close(key.fd)
+                lng, args, pid, chunks, build_dir, manifest = running.pop(
+                    key.fd)
+                rv = os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+                print("Invoke {}".format(' '.join(map(str, args))))
+                print(b''.join(chunks).decode(errors='replace'), end='')
+                if rv:
+                    failures[lng] = rv
+                else:
+                    self.write_manifest(build_dir, manifest)
+                    self.store_in_cache(ctx, build_dir, manifest, lng)
+        sel.close()
+        return failures
 
     def load_conf(self):
         if self.src_path is None:
@@ -178,12 +348,165 @@ class SphinxTree(DocTree):
         return u"{}->{}".format(self.rel_path, self.conf_globals.get('html_title'))
 
     def sphinx_build(self, ctx, builder, docs_dir,
-                     cmdline_args=[], language=None, build_dir_cmd=None):
+                     cmdline_args=[], language=None, build_dir_cmd=None,
+                     hashes=None):
         if self.out_path is None:
             return
+        args, build_dir = self.get_sphinx_args(
+            ctx, builder, cmdline_args, language)
+        manifest = self.make_manifest(args, hashes)
+        if self.is_up_to_date(build_dir, manifest):
+            return
+        if self.restore_from_cache(ctx, build_dir, manifest, language):
+            return
+
+        if get_sphinx_engine(ctx) == 'inprocess':
+            print("Run {} (in-process)".format(' '.join(map(str, args))))
+            with cd(docs_dir):
+                rv, warnings = sphinx_main(args)
+            self.warnings[language] = warnings
+            if rv:
+                raise Exit("sphinx-build failed in {}".format(docs_dir),
+                           code=rv)
+        else:
+            run_cmd(ctx, docs_dir, args)
+        self.write_manifest(build_dir, manifest)
+        self.store_in_cache(ctx, build_dir, manifest, language)
+
+        if build_dir_cmd is not None:
+            with cd(build_dir):
+                ctx.run(build_dir_cmd, pty=True)
+
+    def get_source_hashes(self):
+        """
+        Return a dict mapping the name of every file on which the output of
+        this doctree depends to a hash of its content: the files of the
+        doctree itself (including the :xfile:`conf.py`), the directories
+        given in its `templates_path` and `locale_dirs`, and the Python
+        sources of the main package of the project.
+        """
+        self.load_conf()
+        dirs = [(self.src_path, None)]
+        for name in ('templates_path', 'locale_dirs'):
+            for d in self.conf_globals.get(name, []):
+                dirs.append((self.src_path / d, None))
+        main_package = self.prj.main_package
+        if main_package is not None and getattr(
+                main_package, '__file__', None):
+            dirs.append((Path(main_package.__file__).parent, '.py'))
+        out_path = str(self.out_path.resolve())
+        hashes = dict()
+        for top, suffix in dirs:
+            top = top.resolve()
+            for dirpath, dirnames, filenames in os.walk(str(top)):
+                dirnames[:] = sorted([
+                    d for d in dirnames if not d.startswith('.')
+                    and d != '__pycache__'
+                    and os.path.join(dirpath, d) != out_path])
+                for fn in filenames:
+                    if suffix and not fn.endswith(suffix):
+                        continue
+                    if fn.endswith('.pyc') or (
+                            fn.startswith('warnings_') and fn.endswith('.txt')):
+                        continue
+                    path = os.path.join(dirpath, fn)
+                    if path in hashes:
+                        continue
+                    with open(path, 'rb') as f:
+                        hashes[path] = hashlib.sha1(f.read()).hexdigest()
+        return hashes
+
+    def make_manifest(self, args, hashes):
+        if hashes is None:
+            return None
+        return dict(args=[str(a) for a in args], files=hashes)
+
+    def is_up_to_date(self, build_dir, manifest):
+        """
+        Whether the last successful build in `build_dir` was made from the
+        given manifest.  Print a message if so.
+        """
+        if manifest is None:
+            return False
+        fn = build_dir / MANIFEST_FILE
+        if not fn.exists():
+            return False
+        with open(fn) as f:
+            try:
+                old = json.load(f)
+            except ValueError:
+                return False
+        if old != manifest:
+            return False
+        print("{} is up to date".format(build_dir))
+        return True
+
+    def write_manifest(self, build_dir, manifest):
+        if manifest is None:
+            return
+        with open(build_dir / MANIFEST_FILE, 'w') as f:
+            json.dump(manifest, f)
+
+    def get_doc_cache(self, ctx):
+        """Return the :class:`DocCache
+        <atelier.invlib.doccache.DocCache>` configured by
+        :envvar:`doc_cache_dir`, or `None`."""
+        if not ctx.doc_cache_dir:
+            return None
+        from atelier.invlib.doccache import DocCache
+        return DocCache(ctx.doc_cache_dir, ctx.doc_cache_size)
+
+    def get_cache_key(self, manifest):
+        from atelier.invlib.doccache import make_key, get_version
+        self.load_conf()
+        names = ['sphinx', self.conf_globals.get('html_theme', 'alabaster')]
+        names += self.conf_globals.get('extensions', [])
+        versions = {name: get_version(name) for name in names}
+        return make_key(manifest['args'], manifest['files'],
+                        self.prj.root_dir, versions)
+
+    def get_cache_exclude(self, language):
+        # the output of the main language contains the output of the
+        # translated languages and the data copied by sync_docs_data()
+        exclude = {MANIFEST_FILE}
+        if language is None:
+            self.load_conf()
+            exclude.add('dl')
+            exclude.update(self.conf_globals.get('translated_languages', []))
+        return exclude
+
+    def restore_from_cache(self, ctx, build_dir, manifest, language):
+        """
+        Restore the output of the build described by `manifest` from the
+        :envvar:`doc_cache_dir` into `build_dir`.  Return `True` on success.
+        """
+        cache = self.get_doc_cache(ctx)
+        if cache is None or manifest is None:
+            return False
+        if not cache.restore(self.get_cache_key(manifest), build_dir,
+                             self.get_cache_exclude(language)):
+            return False
+        self.write_manifest(build_dir, manifest)
+        print("Restored {} from {}".format(build_dir, cache.cache_dir))
+        return True
+
+    def store_in_cache(self, ctx, build_dir, manifest, language):
+        """Store the output of a successful build in the
+        :envvar:`doc_cache_dir`."""
+        cache = self.get_doc_cache(ctx)
+        if cache is None or manifest is None:
+            return
+        cache.store(self.get_cache_key(manifest), build_dir,
+                    self.get_cache_exclude(language))
+
+    def get_sphinx_args(self, ctx, builder, cmdline_args=[], language=None):
+        """Return the command line for :cmd:`sphinx-build` and the
+        directory where it will write its output."""
         # args = ['sphinx-build', builder]
         args = ['sphinx-build', '-b', builder]
         args += ['-T'] # show full traceback on exception
+        if ctx.sphinx_jobs:
+            args += ['-j', str(ctx.sphinx_jobs)]
         args += cmdline_args
         # ~ args += ['-a'] # all files, not only outdated
         # ~ args += ['-P'] # no postmortem
@@ -200,19 +523,17 @@ class SphinxTree(DocTree):
         # is no longer in .build but the source directory.
         args += ['-d', str(build_dir / '.doctrees')]
         if ctx.tolerate_sphinx_warnings:
-            args += ['-w', 'warnings_%s.txt' % builder]
+            if language is None:
+                args += ['-w', 'warnings_%s.txt' % builder]
+            else:
+                args += ['-w', 'warnings_%s_%s.txt' % (builder, language)]
         else:
             args += ['-W']  # consider warnings as errors
             args += ['--keep-going']  # but keep going until the end to show them all
             # args += ['-vvv']  # increase verbosity
         # args += ['-w'+Path(ctx.root_dir,'sphinx_doctest_warnings.txt')]
         args += ['.', str(build_dir)]
-
-        run_cmd(ctx, docs_dir, args)
-
-        if build_dir_cmd is not None:
-            with cd(build_dir):
-                ctx.run(build_dir_cmd, pty=True)
+        return args, build_dir
 
     def sync_docs_data(self, ctx, docs_dir):
         # build_dir = docs_dir / ctx.build_dir_name
@@ -0,0 +1,171 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2026 Rumma & Ko Ltd
+# License: BSD, see LICENSE for more details.
+
+"""
+An opt-in profiler for the startup of atelier.
+
+When the environment variable :envvar:`ATELIER_PROFILE` is set to a
+non-empty value other than ``0``, atelier records the wall time and the time
+spent in import statements of the phases that are known to be slow (see
+:func:`phase`) and prints a report to stderr when the process exits.  When
+:envvar:`ATELIER_PROFILE_TRACE` contains a file name, it also writes the
+phases to that file in the Chrome trace event format, which you can open in
+a trace viewer like https://ui.perfetto.dev.
+
+>>> from atelier.profiler import Profiler
+>>> p = Profiler()
+>>> with p.phase('demo', 'myproject'):
+...     pass
+>>> [(r['name'], r['project']) for r in p.records]
+[('demo', 'myproject')]
+>>> p.trace()['traceEvents'][0]['ph']
+'X'
+
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import builtins
+import threading
+
+
+class NoPhase(object):
+    """A context manager that does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NO_PHASE = NoPhase()
+
+
+class Phase(object):
+    """A context manager that records a phase in a :class:`Profiler`."""
+
+    def __init__(self, profiler, name, project):
+        self.profiler = profiler
+        self.name = name
+        self.project = project
+
+    def __enter__(self):
+        self.modules = len(sys.modules)
+        self.import_time = self.profiler.get_import_time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        p = self.profiler
+        p.records.append(dict(
+            name=self.name, project=self.project,
+            started=self.started - p.started,
+            wall=time.perf_counter() - self.started,
+            import_time=p.get_import_time() - self.import_time,
+            modules=len(sys.modules) - self.modules,
+            thread=threading.get_ident()))
+
+
+class Profiler(object):
+    """
+    Collects the phases of the current process.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.started = time.perf_counter()
+        self.local = threading.local()
+
+    def phase(self, name, project=None):
+        """Return a context manager that records the phase `name` (for
+        the given `project`)."""
+        return Phase(self, name, project)
+
+    def get_import_time(self):
+        return getattr(self.local, 'import_time', 0.0)
+
+    def install(self):
+        """Measure the time spent in import statements."""
+        original = builtins.__import__
+        local = self.local
+
+        def timed_import(*args, **kwargs):
+            if getattr(local, 'importing', False):
+                return original(*args, **kwargs)
+            local.importing = True
+            t0 = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                local.importing = False
+                local.import_time = (getattr(local, 'import_time', 0.0) +
+                                     time.perf_counter() - t0)
+
+        builtins.__import__ = timed_import
+
+    def report(self, stream=None):
+        """Print the recorded phases, longest first."""
+        stream = stream or sys.stderr
+        total = time.perf_counter() - self.started
+        stream.write(
+            "atelier profile: {:.3f}s since startup, {} phases\n".format(
+                total, len(self.records)))
+        stream.write("{:>9} {:>9} {:>7}  {}\n".format(
+            "wall", "imports", "modules", "phase"))
+        for r in sorted(self.records, key=lambda r: -r['wall']):
+            name = r['name']
+            if r['project']:
+                name += " (" + r['project'] + ")"
+            stream.write("{:8.3f}s {:8.3f}s {:7d}  {}\n".format(
+                r['wall'], r['import_time'], r['modules'], name))
+
+    def trace(self):
+        """Return the recorded phases as a Chrome trace."""
+        events = []
+        for r in self.records:
+            name = r['name']
+            if r['project']:
+                name += " " + r['project']
+            events.append(dict(
+                name=name, cat='atelier', ph='X', pid=os.getpid(),
+                tid=r['thread'], ts=int(r['started'] * 1e6),
+                dur=int(r['wall'] * 1e6), args=dict(
+                    project=r['project'], import_time=r['import_time'],
+                    modules=r['modules'])))
+        return dict(traceEvents=events)
+
+    def write_trace(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.trace(), f)
+
+    def finish(self):
+        self.report()
+        filename = os.environ.get('ATELIER_PROFILE_TRACE')
+        if filename:
+            self.write_trace(filename)
+            sys.stderr.write("Wrote trace to {}\n".format(filename))
+
+
+profiler = None
+"""The :class:`Profiler` of this process, or `None` when profiling is not
+enabled."""
+
+if os.environ.get('ATELIER_PROFILE', '') not in ('', '0'):
+    profiler = Profiler()
+    profiler.install()
+    atexit.register(profiler.finish)
+
+
+def phase(name, project=None):
+    """
+    Return a context manager that records the phase `name` (for the given
+    `project`), or that does nothing if profiling is not enabled.
+    """
+    if profiler is None:
+        return NO_PHASE
+    return profiler.phase(name, project)
@@ -7,6 +7,15 @@ See :doc:`/usage`.
 
 """
 import os
+import sys
+import json
+import pickle
+import hashlib
+import threading
+import subprocess
+from types import MappingProxyType
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
 
 # import pkg_resources
 from pathlib import Path
@@ -16,18 +25,83 @@ except ImportError:
     from django.utils.importlib import import_module
 
 from atelier.invlib.utils import SphinxTree
+from atelier.setupreader import read_setup_info, NotStatic, Evaluator
+from atelier.profiler import phase
 
 config_files = ['~/.atelier/config.py', '/etc/atelier/config.py',
                 '~/_atelier/config.py']
 
+projects_file = '~/.atelier/projects.toml'
+
+PRUNE_DIRS = {'.git', '.hg', '.svn', '.build', '_build', '.tox', '.venv',
+              '.eggs', 'node_modules', '__pycache__'}
+"""The names of the directories in which :func:`discover_projects` doesn't
+search for projects."""
+
+cache_dir = '~/.atelier/cache'
+
+CACHED_SETUP_INFO_KEYS = (
+    'name', 'version', 'url', 'description', 'install_requires')
+
 _PROJECT_INFOS = []
 _PROJECTS_DICT = {}
+_NICKNAMES = {}
+_PACKAGES = {}
+_PATH_TRIE = {}
+_GIT_STATUS_CACHE = {}
+_LOCK = threading.RLock()
+_CONFIG_LOADING = False
+_CONFIG_LOADED = False
+
+SETUP_PY_RUNNER = """
+import os, sys, pickle, traceback
+out = os.fdopen(os.dup(1), 'wb')
+os.dup2(2, 1)
+g = dict(__name__='not_main')
+try:
+    with open('setup.py') as f:
+        exec(compile(f.read(), 'setup.py', 'exec'), g)
+    info = g.get('SETUP_INFO')
+    if isinstance(info, dict):
+        # pickle every value separately so that one value that cannot be
+        # pickled doesn't prevent us from sending the others
+        values = {}
+        for k, v in info.items():
+            try:
+                values[k] = pickle.dumps(v)
+            except Exception:
+                pass
+        info = values
+    rv = ('ok', info)
+except SystemExit:
+    rv = ('exit', None)
+except BaseException:
+    rv = ('error', traceback.format_exc())
+try:
+    out.write(pickle.dumps(rv))
+except Exception:
+    out.write(pickle.dumps(('error', traceback.format_exc())))
+"""
+"""The Python code run in a subprocess by :func:`exec_setup_info`."""
+
+INFO_RUNNER = """
+import sys
+from atelier.projects import get_project_from_path
+prj = get_project_from_path(sys.argv[1])
+prj.get_cached_info(refresh='--refresh' in sys.argv[2:])
+"""
+"""The Python code run in a subprocess by
+:meth:`Project.read_info_in_subprocess`."""
 
 
 def load_inv_namespace(root_dir):
     """
     Execute the :xfile:`tasks.py` file of this project and return its
     `ns`.
+
+    The file is executed in the current working directory of the caller,
+    not in `root_dir`.  A :xfile:`tasks.py` file should use its `__file__`
+    to find the files of its project.
     """
     # self._tasks_loaded = True
 
@@ -41,13 +115,11 @@ def load_inv_namespace(root_dir):
     # http://stackoverflow.com/questions/67631/how-to-import-a-module-given-the-full-path
     # http://stackoverflow.com/questions/19009932/import-arbitrary-python-source-file-python-3-3
     # fqname = 'atelier.prj_%s' % self.index
-    cwd = Path().resolve()
-    os.chdir(root_dir)
     m = dict()
     m["__file__"] = str(tasks_file)
-    with open(tasks_file) as f:
-        exec(f.read(), m)
-    os.chdir(cwd)
+    with phase('load_inv_namespace', root_dir.name):
+        with open(tasks_file) as f:
+            exec(compile(f.read(), str(tasks_file), 'exec'), m)
     return m['ns']
 
 
@@ -64,18 +136,62 @@ def add_project(root_dir, nickname=None):
 
     Returns a :class:`Project` instance describing the project.
     """
-    i = len(_PROJECT_INFOS)
     root_dir = Path(root_dir).absolute().resolve()
     if not root_dir.exists():
         raise Exception("Invalid root directory {}".format(root_dir))
-    p = Project(i, root_dir, nickname=None)
-    _PROJECT_INFOS.append(p)
-    _PROJECTS_DICT[root_dir] = p
+    ensure_config()
+    return _add_project(root_dir, nickname)
+
+
+def _add_project(root_dir, nickname):
+    with _LOCK:
+        i = len(_PROJECT_INFOS)
+        p = Project(i, root_dir, nickname=nickname)
+        _PROJECT_INFOS.append(p)
+        _PROJECTS_DICT[root_dir] = p
+        _NICKNAMES.setdefault(p.nickname, p)
+        node = _PATH_TRIE
+        for part in root_dir.parts:
+            node = node.setdefault(part, {})
+        node[None] = p
     return p
 
 
+def _forget_projects(count):
+    # unregister all projects except the first `count` ones
+    with _LOCK:
+        forgotten = _PROJECT_INFOS[count:]
+        del _PROJECT_INFOS[count:]
+        for d in (_NICKNAMES, _PACKAGES):
+            for k, p in list(d.items()):
+                if p in forgotten:
+                    del d[k]
+        _PROJECTS_DICT.clear()
+        _PATH_TRIE.clear()
+        for p in _PROJECT_INFOS:
+            _PROJECTS_DICT[p.root_dir] = p
+            node = _PATH_TRIE
+            for part in p.root_dir.parts:
+                node = node.setdefault(part, {})
+            node[None] = p
+
+
+def register_package(prj, name):
+    """
+    Register `prj` as the project whose main package is named `name`.
+    Called automatically when the main package of a project becomes known.
+    """
+    if name:
+        with _LOCK:
+            _PACKAGES.setdefault(name, prj)
+
+
 def get_project_info_from_mod(modname):
     """Find the project info for the given Python module."""
+    ensure_config()
+    prj = get_project_from_package(modname)
+    if prj is not None and prj.main_package is not None:
+        return prj
     m = import_module(modname)
     if m.__file__ is None:
         raise Exception("Invalid module name {} (is it installed?)".format(modname))
@@ -96,16 +212,44 @@ def get_project_info_from_mod(modname):
 
 def get_project_from_nickname(name):
     "Find the project info for the given nickname."
-    for p in _PROJECT_INFOS:
-        if p.nickname == name:
-            return p
+    ensure_config()
+    return _NICKNAMES.get(name)
+
+
+def get_project_from_package(name):
+    """
+    Find the project whose main package has the given name, or return
+    `None`.  This doesn't import anything. Only projects whose main package
+    is known (because the project has been loaded or because its metadata
+    is cached, see :meth:`Project.get_cached_info`) are found.
+    """
+    ensure_config()
+    return _PACKAGES.get(name)
+
+
+def get_project_from_path(path):
+    """
+    Find the project whose root directory contains the given absolute
+    path, or return `None`.  When projects are nested, return the innermost
+    one.  The path is not resolved, so it should not contain symbolic links.
+    """
+    ensure_config()
+    prj = None
+    node = _PATH_TRIE
+    for part in Path(path).absolute().parts:
+        node = node.get(part)
+        if node is None:
+            break
+        prj = node.get(None, prj)
+    return prj
 
 def get_project_from_tasks(root_dir):
     "Find the project info for the given directory."
     root_dir = root_dir.absolute().resolve()
-    prj = _PROJECTS_DICT.get(root_dir)
-    if prj is None:
-        if (root_dir / 'tasks.py').exists():
+    ensure_config()
+    with _LOCK:
+        prj = _PROJECTS_DICT.get(root_dir)
+        if prj is None and (root_dir / 'tasks.py').exists():
             return add_project(root_dir)
         # if no config.py found, add current working directory.
         # p = Path().resolve()
@@ -121,48 +265,132 @@ def get_project_from_tasks(root_dir):
 
 
 def load_projects():
+    ensure_config()
     for p in _PROJECT_INFOS:
         yield p
 
 
+def load_all_projects(parallel=True, jobs=None, refresh=False):
+    """
+    Load the cached metadata of all projects (see
+    :meth:`Project.get_cached_info`) and return them as a list.  When
+    `refresh` is True, ignore the caches and rewrite them.
+
+    When `parallel` is True, the projects are loaded concurrently using a
+    pool of at most `jobs` worker threads, each of which loads its project in
+    a subprocess (see :meth:`Project.load_cached_info`).  Executing the
+    :xfile:`tasks.py` files of several projects in the same process at the
+    same time is not safe because :func:`atelier.invlib.setup_from_tasks`
+    changes global state like :data:`atelier.current_project` or the Django
+    settings.  This doesn't change :data:`atelier.current_project`.
+    """
+    import atelier
+    projects = list(load_projects())
+    current_project = atelier.current_project
+    try:
+        if parallel:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                list(executor.map(
+                    lambda p: p.load_cached_info(refresh), projects))
+        else:
+            for p in projects:
+                p.get_cached_info(refresh)
+    finally:
+        atelier.current_project = current_project
+    return projects
+
+
 def get_setup_info(root_dir):
     """
     Return `SETUP_INFO` defined in the :xfile:`setup.py` file of the
     specified `root_dir`.
+    """
+    return load_setup_info(root_dir)[0]
+
+
+def load_setup_info(root_dir):
+    """
+    Return a tuple `(info, method)` where `info` is the `SETUP_INFO` defined
+    in the :xfile:`setup.py` file of the specified `root_dir` and `method`
+    says how it has been found out:
+
+    - ``'static'`` : the file has been evaluated without executing it (see
+      :mod:`atelier.setupreader`)
+    - ``'exec'`` : the file has been executed because it cannot be evaluated
+      statically
+    - ``None`` : there is no :xfile:`setup.py` file
+
     """
     setup_file = root_dir / 'setup.py'
     if not setup_file.exists():
         # print("20180118 no setup.py file in {}".format(root_dir.absolute()))
-        return {}
-        # raise RuntimeError(
-        #     "You must call 'inv' from a project's root directory.")
-    # sys.path.insert(0, root_dir)
-    # setup_module = __import__('setup')
-    # print 20140610, root_dir
-    # del sys.path[0]
-    # return getattr(setup_module, 'SETUP_INFO', None)
-    g = dict()
-    g['__name__'] = 'not_main'
-    # g['__file__'] = setup_file
-    cwd = Path().resolve()
-    os.chdir(root_dir)
-    with open("setup.py") as f:
-        code = compile(f.read(), "setup.py", 'exec')
-        try:
-            exec(code, g)
-        except SystemExit:
-            os.chdir(cwd)
-            raise Exception(
-                "Oops, {} called sys.exit().\n"
-                "Atelier requires the setup() call to be in a "
-                "\"if __name__ == '__main__':\" condition.".format(
-                    setup_file))
-    os.chdir(cwd)
-    info = g.get('SETUP_INFO')
+        return {}, None
+    try:
+        with phase('get_setup_info (static)', root_dir.name):
+            info = read_setup_info(root_dir)
+    except NotStatic:
+        with phase('get_setup_info (exec)', root_dir.name):
+            return exec_setup_info(root_dir), 'exec'
+    if info is None:
+        raise Exception(
+            "Oops, {} doesn't define a name SETUP_INFO.".format(
+                setup_file))
+    return info, 'static'
+
+
+def exec_setup_info(root_dir):
+    """
+    Execute the :xfile:`setup.py` file of the specified `root_dir` and
+    return the `SETUP_INFO` it defines.
+
+    The file is executed in a subprocess (see :data:`SETUP_PY_RUNNER`) so
+    that it cannot change the state of the current process.  Values of
+    :envvar:`SETUP_INFO` that cannot be passed from the subprocess to the
+    current process (e.g. a class defined in the :xfile:`setup.py` file
+    and used in `cmdclass`) are left away.
+
+    >>> import tempfile
+    >>> from pathlib import Path
+    >>> from atelier.projects import exec_setup_info
+    >>> root_dir = Path(tempfile.mkdtemp())
+    >>> _ = (root_dir / 'setup.py').write_text('''
+    ... class MyBuild:
+    ...     pass
+    ... SETUP_INFO = dict(name='alpha', cmdclass={'build_py': MyBuild})
+    ... ''')
+    >>> exec_setup_info(root_dir)
+    {'name': 'alpha'}
+    """
+    setup_file = root_dir / 'setup.py'
+    p = subprocess.run(
+        [sys.executable, '-c', SETUP_PY_RUNNER], cwd=str(root_dir),
+        stdout=subprocess.PIPE)
+    try:
+        status, info = pickle.loads(p.stdout)
+    except Exception:
+        raise Exception("Oops, failed to execute {} (exit code {}).".format(
+            setup_file, p.returncode))
+    if status == 'exit':
+        raise Exception(
+            "Oops, {} called sys.exit().\n"
+            "Atelier requires the setup() call to be in a "
+            "\"if __name__ == '__main__':\" condition.".format(
+                setup_file))
+    if status == 'error':
+        raise Exception("Oops, failed to execute {}:\n{}".format(
+            setup_file, info))
     if info is None:
         raise Exception(
             "Oops, {} doesn't define a name SETUP_INFO.".format(
                 setup_file))
+    if isinstance(info, dict):
+        values = info
+        info = {}
+        for k, v in values.items():
+            try:
+                info[k] = pickle.loads(v)
+            except Exception:
+                pass
     return info
 
     # # Expected to define global SETUP_INFO.
@@ -177,6 +405,157 @@ def get_setup_info(root_dir):
     # env.SETUP_INFO = SETUP_INFO
 
 
+def file_signature(fn):
+    """
+    Return a list `[mtime, size]` describing the current state of the given
+    file, or `None` if the file doesn't exist.
+    """
+    try:
+        st = os.stat(fn)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def git_status(root_dir, cached=True):
+    """
+    Return a short status description of the git repository in `root_dir`:
+    the name of the active branch (or "?" when HEAD is detached), followed
+    by "!" if the working tree or the index contain uncommitted changes.
+    Untracked files are ignored.
+
+    This runs a single :cmd:`git status` command.  The result is cached
+    for the lifetime of the current process and reused as long as the
+    modification times of the repository's :file:`.git/index` and
+    :file:`.git/HEAD` files don't change.  When `cached` is False, the
+    cache is ignored.
+    """
+    git_dir = root_dir / '.git'
+    use_cache = cached and git_dir.is_dir()
+    if use_cache:
+        entry = _GIT_STATUS_CACHE.get(root_dir)
+        if entry is not None and entry[0] == _git_status_key(git_dir):
+            return entry[1]
+    args = ['git', 'status', '--porcelain=v2', '--branch',
+            '--untracked-files=no']
+    p = subprocess.run(
+        args, cwd=root_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if p.returncode:
+        raise Exception("{} failed in {}: {}".format(
+            ' '.join(args), root_dir, p.stderr.strip()))
+    s = "?"
+    dirty = False
+    for ln in p.stdout.splitlines():
+        if ln.startswith('# branch.head '):
+            head = ln[len('# branch.head '):]
+            if head != '(detached)':
+                s = head
+        elif not ln.startswith('#'):
+            dirty = True
+    if dirty:
+        s += "!"
+    if use_cache:
+        # read the key only now because git status may have refreshed the
+        # index
+        _GIT_STATUS_CACHE[root_dir] = (_git_status_key(git_dir), s)
+    return s
+
+
+def _git_status_key(git_dir):
+    # the key under which git_status() caches the status of a repository
+    return (file_signature(git_dir / 'index'),
+            file_signature(git_dir / 'HEAD'))
+
+
+def git_fingerprint(root_dir):
+    """
+    Return a string that changes whenever the content of the git working tree
+    in `root_dir` changes: a hash of the commit id of HEAD and of the names
+    and contents of all modified and untracked (but not ignored) files.
+
+    This runs a single :cmd:`git status` command.
+    """
+    args = ['git', 'status', '--porcelain=v2', '--branch', '-z',
+            '--untracked-files=all']
+    p = subprocess.run(
+        args, cwd=root_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if p.returncode:
+        raise Exception("{} failed in {}: {}".format(
+            ' '.join(args), root_dir, p.stderr.decode().strip()))
+    h = hashlib.sha1()
+    entries = iter(p.stdout.split(b'\0'))
+    for entry in entries:
+        if entry.startswith(b'# branch.oid '):
+            h.update(entry)
+            continue
+        if entry.startswith(b'1 '):
+            name = entry.split(b' ', 8)[8]
+        elif entry.startswith(b'2 '):
+            name = entry.split(b' ', 9)[9]
+            next(entries)  # skip the original path of a renamed file
+        elif entry.startswith(b'u '):
+            name = entry.split(b' ', 10)[10]
+        elif entry.startswith(b'? '):
+            name = entry[2:]
+        else:
+            continue
+        h.update(entry)
+        fn = root_dir / os.fsdecode(name)
+        if fn.is_file():
+            with open(fn, 'rb') as f:
+                h.update(hashlib.sha1(f.read()).digest())
+    return h.hexdigest()
+
+
+def load_git_status(projects, jobs=None):
+    """
+    Collect the git status of all given projects concurrently, using a pool
+    of at most `jobs` worker threads.  Afterwards :meth:`Project.get_status`
+    returns without running any subprocess.
+
+    When :cmd:`atelierd` is running, ask it for the status and the cached
+    metadata of all projects instead.
+    """
+    from atelier.daemon import query
+    rv = query('list')
+    if rv is not None:
+        for p in projects:
+            state = rv['projects'].get(str(p.root_dir))
+            if state is not None and 'info' in state:
+                p._cached_info = state['info']
+                p._status = state['status']
+        projects = [p for p in projects if p._status is None]
+
+    def load(p):
+        config = p.load_cached_info()['config']
+        if config['revision_control_system'] == 'git':
+            git_status(p.root_dir)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(load, projects))
+
+
+class ProjectConfig(dict):
+    """
+    The dict of configuration settings of a :class:`Project`.  Modifying it
+    invalidates the merged view returned by :meth:`Project.get_xconfigs`.
+    """
+    project = None
+
+    def changed(self):
+        if self.project is not None:
+            self.project.invalidate_xconfigs()
+
+    def __setitem__(self, k, v):
+        super(ProjectConfig, self).__setitem__(k, v)
+        self.changed()
+
+    def update(self, *args, **kwargs):
+        super(ProjectConfig, self).update(*args, **kwargs)
+        self.changed()
+
+
 class Project(object):
     """Represents a project.
 
@@ -194,20 +573,30 @@ class Project(object):
         A dict containing the configuration options of this project.
         See :ref:`atelier.prjconf`.
 
+    .. attribute:: setup_info_method
+
+        How the :envvar:`SETUP_INFO` of this project has been read (see
+        :func:`load_setup_info`).
+
     """
     main_package = None
     # srcref_url = None
     # intersphinx_urls = {}
     SETUP_INFO = None
+    setup_info_method = None
     config = None
     inv_namespace = None
-    _git_status = None
+    _cached_info = None
+    _status = None
+    _xconfigs = None
+    _lock = None
 
     def __init__(self, i, root_dir, nickname=None):
         # , inv_namespace=None, main_package=None):
 
         self.index = i
         self.root_dir = root_dir
+        self._lock = threading.RLock()
         #~ self.local_name = local_name
         #~ self.root_dir = Path(atelier.PROJECTS_HOME,local_name)
         self.nickname = nickname or str(self.root_dir.name)
@@ -217,7 +606,7 @@ class Project(object):
         # print("20180428 Project {} initialized".format(self.nickname))
         #self.main_package = main_package
         #self.inv_namespace = inv_namespace
-        self.config = {
+        self.config = ProjectConfig({
             'root_dir': root_dir,
             'build_dir_name': '.build', # e.g. ablog needs '_build'
             'project_name': str(root_dir.name),
@@ -225,6 +614,7 @@ class Project(object):
             'help_texts_source': None,
             'help_texts_module': None,
             'tolerate_sphinx_warnings': False,
+            'isolated_tasks': False,
             'cleanable_files': [],
             'revision_control_system': None,
             'apidoc_exclude_pathnames': [],
@@ -242,9 +632,15 @@ class Project(object):
             'sdist_dir': root_dir / 'dist',
             'pypi_dir': root_dir / '.pypi_cache',
             'use_dirhtml': False,
+            'doc_build_jobs': None,
+            'sphinx_jobs': None,
+            'sphinx_engine': 'process',
+            'doc_cache_dir': None,
+            'doc_cache_size': 1000,
             'doc_trees': ['docs'],
             'intersphinx_urls': {},
-        }
+        })
+        self.config.project = self
 
 
     def __repr__(self):
@@ -252,10 +648,13 @@ class Project(object):
 
     def set_main_package(self, m):
         self.main_package = m
+        self.invalidate_xconfigs()
+        register_package(self, m.__name__)
 
     def set_namespace(self, ns):
         self.inv_namespace = ns
         ns.configure(self.config)
+        self.invalidate_xconfigs()
         if self.main_package is None:
             # when no main_package is given, there must be a namespace
             cfg = ns.configuration()
@@ -265,7 +664,7 @@ class Project(object):
             if name:
                 # self.doc_trees = None
                 # self.name = name
-                self.main_package = import_module(name)
+                self.set_main_package(import_module(name))
                 # if self.main_package is None:
                 #     raise Exception("Failed to import {}".format(name))
 
@@ -287,11 +686,14 @@ class Project(object):
         # inv_namespace = self.inv_namespace or load_inv_namespace(
         #     self.root_dir)
 
-        if self.SETUP_INFO is not None:
-            # load_info() has been called before
-            return
+        with self._lock:
+            if self.SETUP_INFO is None:
+                # load_info() has not been called before
+                self._load_info()
 
-        self.SETUP_INFO = get_setup_info(self.root_dir)
+    def _load_info(self):
+        self.SETUP_INFO, self.setup_info_method = load_setup_info(
+            self.root_dir)
 
         # if self.main_package is None:
         #     self.config.setdefault('doc_trees', ['docs'])
@@ -307,42 +709,186 @@ class Project(object):
         # if self.main_package is None:
         #     self.config.update(doc_trees=['docs'])
 
+    def get_info_files(self):
+        """
+        Yield the files that define the metadata of this project.  The
+        metadata cached by :meth:`get_cached_info` remains valid as long as
+        none of these files has been modified.
+        """
+        yield self.root_dir / 'setup.py'
+        yield self.root_dir / 'tasks.py'
+        if self.main_package is not None:
+            fn = getattr(self.main_package, '__file__', None)
+            if fn is not None:
+                yield Path(fn).parent / 'setup_info.py'
+
+    def get_cache_file(self):
+        """Return the file used by :meth:`get_cached_info`."""
+        h = hashlib.sha1(str(self.root_dir).encode()).hexdigest()[:12]
+        return Path(os.path.expanduser(cache_dir)) / "{}-{}.json".format(
+            self.nickname, h)
+
+    def get_cached_info(self, refresh=False):
+        """
+        Return a dict with the metadata of this project, taken from a cache
+        file below :xfile:`~/.atelier/cache` if possible.
+
+        The returned dict has the following keys:
+
+        - `SETUP_INFO` : a subset of :envvar:`SETUP_INFO` (name, version,
+          url, description and install_requires)
+        - `config` : the :ref:`project configuration settings
+          <atelier.prjconf>`, with values converted to strings when they are
+          not JSON serializable
+        - `doc_trees` : the relative paths of the project's doc trees
+        - `main_package` : the name of the main package or `None`
+        - `setup_info_method` : how the :envvar:`SETUP_INFO` has been read
+          (see :func:`load_setup_info`)
+
+        The cache is invalidated when the modification time or size of one of
+        the files yielded by :meth:`get_info_files` changes. Otherwise the
+        project's :xfile:`setup.py` and :xfile:`tasks.py` files are not
+        executed at all.  When `refresh` is True, ignore the cache and
+        rewrite it.
+        """
+        with self._lock:
+            if self._cached_info is None or refresh:
+                self._cached_info = self._get_cached_info(refresh)
+                register_package(self, self._cached_info['main_package'])
+            return self._cached_info
+
+    def read_cache_file(self):
+        """
+        Return the content of the cache file used by :meth:`get_cached_info`,
+        or `None` if there is no such file or if it is outdated.
+        """
+        fn = self.get_cache_file()
+        try:
+            with open(fn) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data and all([file_signature(f) == sig
+                         for f, sig in data['files']]):
+            return data
+
+    def read_info_in_subprocess(self, refresh=False):
+        """
+        Update the cache file used by :meth:`get_cached_info` in a subprocess
+        (see :data:`INFO_RUNNER`) and return its content, or `None` if this
+        failed.  Unlike :meth:`get_cached_info`, this never executes the
+        :xfile:`setup.py` or :xfile:`tasks.py` files of the project in the
+        current process.
+        """
+        args = [sys.executable, '-c', INFO_RUNNER, str(self.root_dir)]
+        if refresh:
+            args.append('--refresh')
+        subprocess.run(args, cwd=str(self.root_dir), stdout=subprocess.DEVNULL)
+        return self.read_cache_file()
+
+    def load_cached_info(self, refresh=False):
+        """
+        Same as :meth:`get_cached_info`, but when the cache is outdated (or
+        `refresh` is True), update it in a subprocess (see
+        :meth:`read_info_in_subprocess`).  This is thread-safe because it
+        never executes the :xfile:`tasks.py` of the project in the current
+        process.
+        """
+        with self._lock:
+            if self._cached_info is None or refresh:
+                info = None if refresh else self.read_cache_file()
+                if info is None:
+                    info = self.read_info_in_subprocess(refresh)
+                if info is None:
+                    raise Exception("Failed to load {}".format(self.root_dir))
+                self._cached_info = info
+                register_package(self, info['main_package'])
+            return self._cached_info
+
+    def _get_cached_info(self, refresh):
+        if not refresh:
+            data = self.read_cache_file()
+            if data is not None:
+                return data
+        self.load_info()
+        fn = self.get_cache_file()
+        files = [(str(f), file_signature(f)) for f in self.get_info_files()]
+        data = dict(
+            files=files,
+            SETUP_INFO={k: self.SETUP_INFO[k] for k in CACHED_SETUP_INFO_KEYS
+                        if k in self.SETUP_INFO},
+            config=json.loads(json.dumps(self.config, default=str)),
+            doc_trees=[str(t.rel_path) for t in self.get_doc_trees()],
+            main_package=getattr(self.main_package, '__name__', None),
+            setup_info_method=self.setup_info_method)
+        fn.parent.mkdir(parents=True, exist_ok=True)
+        tmp = fn.with_suffix('.tmp{}'.format(os.getpid()))
+        with open(tmp, 'w') as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp, fn)
+        return data
+
     def get_status(self):
         # if self.config['revision_control_system'] != 'git':
         # config = self.inv_namespace.configuration()
-        self.load_info()
-        if self.config['revision_control_system'] != 'git':
+        if self._status is not None:
+            return self._status
+        config = self.get_cached_info()['config']
+        if config['revision_control_system'] != 'git':
             return ''
-        if self._git_status is not None:
-            return self._git_status
-        from git import Repo
-        repo = Repo(self.root_dir)
-        try:
-            s = str(repo.active_branch)
-        except TypeError:
-            s = "?"
-        if repo.is_dirty():
-            s += "!"
-        self._git_status = s
-        return s
+        from atelier.daemon import query
+        rv = query('status', root_dir=str(self.root_dir))
+        if rv is not None and 'status' in rv:
+            return rv['status']
+        return git_status(self.root_dir)
+
+    def get_fingerprint(self):
+        """
+        Return a fingerprint of the working tree of this project (see
+        :func:`git_fingerprint`), or `None` if this project doesn't use git.
+        """
+        config = self.get_cached_info()['config']
+        if config['revision_control_system'] != 'git':
+            return None
+        return git_fingerprint(self.root_dir)
 
     def get_xconfig(self, name, default=None):
         """Return the specified setting from either main module or tasks.py.
 
         TODO: explain why we need this.
         """
-        self.load_info()
-        if self.inv_namespace is not None:
-            cfg = self.inv_namespace.configuration()
-            default = cfg.get(name, default)
-        if self.main_package:
-            # if name in cfg:
-            #     msg = "{} configures both {} and main_package. "
-            #     msg += "If you have a main_package then you must set "
-            #     msg += "doc_trees there."
-            #     raise Exception(msg.format(self, name))
-            return getattr(self.main_package, name, default)
-        return default
+        return self.get_xconfigs().get(name, default)
+
+    def get_xconfigs(self):
+        """
+        Return a read-only mapping of all settings available through
+        :meth:`get_xconfig`: the attributes of the main package, falling back
+        to the configuration of the :xfile:`tasks.py`.
+
+        The mapping is computed once and reused until :meth:`set_namespace`
+        or :meth:`set_main_package` is called, or the :attr:`config` of this
+        project is modified.
+        """
+        xconfigs = self._xconfigs
+        if xconfigs is None:
+            self.load_info()
+            maps = []
+            if self.main_package is not None:
+                # if name in cfg:
+                #     msg = "{} configures both {} and main_package. "
+                #     msg += "If you have a main_package then you must set "
+                #     msg += "doc_trees there."
+                #     raise Exception(msg.format(self, name))
+                maps.append(vars(self.main_package))
+            if self.inv_namespace is not None:
+                maps.append(self.inv_namespace.configuration())
+            xconfigs = MappingProxyType(ChainMap(*maps))
+            self._xconfigs = xconfigs
+        return xconfigs
+
+    def invalidate_xconfigs(self):
+        """Forget the mapping computed by :meth:`get_xconfigs`."""
+        self._xconfigs = None
 
     def get_doc_trees(self):
         """
@@ -372,13 +918,236 @@ class Project(object):
                 raise Exception("Invalid item {} in doc_trees".format(
                     rel_doc_tree))
 
+def ensure_config():
+    """
+    Call :func:`load_config` unless this has been done before.  This is
+    called automatically when the projects list is accessed for the first
+    time.
+    """
+    global _CONFIG_LOADING, _CONFIG_LOADED
+    if _CONFIG_LOADED:
+        return
+    with _LOCK:
+        if _CONFIG_LOADED or _CONFIG_LOADING:
+            return
+        _CONFIG_LOADING = True
+        count = len(_PROJECT_INFOS)
+        try:
+            with phase('load_config'):
+                load_config()
+            _CONFIG_LOADED = True
+        except BaseException:
+            # forget the projects registered so far, so that the next
+            # access tries again instead of seeing a partial registry
+            _forget_projects(count)
+            raise
+        finally:
+            _CONFIG_LOADING = False
+
+
 def load_config():
-    for fn in config_files:
-        fn = os.path.expanduser(fn)
-        if os.path.exists(fn):
-            with open(fn) as f:
-                code = compile(f.read(), fn, 'exec')
-                exec(code)
+    """
+    Register the projects defined in :xfile:`~/.atelier/projects.toml` and
+    in the :xfile:`config.py <~/.atelier/config.py>` files.
+
+    When the :xfile:`config.py` files can be evaluated statically (i.e. they
+    do nothing but call :func:`add_project` and :func:`add_workspace`, see
+    :func:`read_config`), the result is stored in a file below
+    :xfile:`~/.atelier/cache`, and as long as none of these files has been
+    modified, the projects are registered from there without reading them
+    again.  Otherwise the :xfile:`config.py` files are executed.
+    """
+    sources = [os.path.expanduser(fn) for fn in [projects_file] + config_files]
+    signatures = [[fn, file_signature(fn)] for fn in sources]
+    sources = [fn for fn, sig in signatures if sig is not None]
+    if not sources:
+        return
+    cache_file = Path(os.path.expanduser(cache_dir)) / 'projects.json'
+    try:
+        with open(cache_file) as f:
+            data = json.load(f)
+        if data['sources'] == signatures:
+            for kind, path, nickname in data['entries']:
+                if kind == 'workspace':
+                    add_workspace(path)
+                else:
+                    _add_project(Path(path), nickname)
+            return
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        entries = []
+        for fn in sources:
+            if fn.endswith('.toml'):
+                entries += read_projects_toml(fn)
+            else:
+                entries += read_config(fn)
+    except NotStatic:
+        for fn in sources:
+            if fn.endswith('.toml'):
+                register_entries(read_projects_toml(fn))
+            else:
+                with open(fn) as f:
+                    code = compile(f.read(), fn, 'exec')
+                    exec(code)
+        return
+    data = dict(sources=signatures, entries=register_entries(entries))
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_file.with_suffix('.tmp{}'.format(os.getpid()))
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, cache_file)
+
+
+def register_entries(entries):
+    """
+    Register the given configuration entries (as returned by
+    :func:`read_config`) and return them with resolved paths.
+    """
+    rv = []
+    for kind, path, nickname in entries:
+        if kind == 'workspace':
+            add_workspace(path)
+            path = Path(os.path.expanduser(path)).absolute().resolve()
+        else:
+            p = add_project(path, nickname)
+            path, nickname = p.root_dir, p.nickname
+        rv.append([kind, str(path), nickname])
+    return rv
+
+
+def read_config(fn):
+    """
+    Statically evaluate the given :xfile:`config.py` file (see
+    :mod:`atelier.setupreader`) and return a list of `(kind, path,
+    nickname)` tuples, one for every call to :func:`add_project` (kind is
+    ``'project'``) or :func:`add_workspace` (kind is ``'workspace'``).
+    Raise :class:`atelier.setupreader.NotStatic` if the file does anything
+    else, including importing anything else than these two functions.
+    """
+    entries = []
+
+    def add_project(root_dir, nickname=None):
+        entries.append(('project', root_dir, nickname))
+
+    def add_workspace(root):
+        entries.append(('workspace', root, None))
 
+    ev = Evaluator(os.path.dirname(fn), known={
+        'atelier.projects.add_project': add_project,
+        'atelier.projects.add_workspace': add_workspace}, strict=True)
+    ev.globals.update(add_project=add_project, add_workspace=add_workspace)
+    ev.run_file(fn)
+    return entries
 
-load_config()
+
+def read_projects_toml(fn):
+    """
+    Read the given :xfile:`~/.atelier/projects.toml` file and return a list
+    of `(kind, path, nickname)` tuples like :func:`read_config`.
+    """
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise Exception(
+                "Reading {} requires Python 3.11 or the tomli "
+                "package.".format(fn))
+    with open(fn, 'rb') as f:
+        data = tomllib.load(f)
+    entries = [('workspace', os.path.expanduser(item['root']), None)
+               for item in data.get('workspace', [])]
+    entries += [('project', os.path.expanduser(item['root_dir']),
+                 item.get('nickname'))
+                for item in data.get('project', [])]
+    return entries
+
+
+def add_workspace(root):
+    """
+    To be called from your :xfile:`config.py` file.
+
+    Register every project below the directory `root` (see
+    :func:`discover_projects`) that has not been registered before.
+    """
+    for root_dir in discover_projects(root):
+        root_dir = Path(root_dir)
+        if root_dir not in _PROJECTS_DICT:
+            _add_project(root_dir, None)
+
+
+def discover_projects(root):
+    """
+    Return a sorted list of the root directories of all projects below the
+    directory `root`.  A project is a directory containing a
+    :xfile:`tasks.py` file that calls :func:`setup_from_tasks
+    <atelier.invlib.setup_from_tasks>`.
+
+    The crawler doesn't descend into projects, into the directories named
+    in :data:`PRUNE_DIRS` and into virtual environments. It remembers what
+    it found in a file below :xfile:`~/.atelier/cache`, and the next time it
+    reads only the directories whose modification time has changed.
+    """
+    root = str(Path(os.path.expanduser(root)).absolute().resolve())
+    h = hashlib.sha1(root.encode()).hexdigest()[:12]
+    cache_file = Path(os.path.expanduser(cache_dir)) / "workspace-{}.json".format(h)
+    try:
+        with open(cache_file) as f:
+            old = json.load(f)
+    except (OSError, ValueError):
+        old = {}
+    new = {}
+    found = []
+    todo = [root]
+    while todo:
+        path = todo.pop()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        entry = old.get(path)
+        if entry is None or entry['mtime'] != mtime or (
+                entry['tasks'] is not None and entry['tasks'] != file_signature(
+                    os.path.join(path, 'tasks.py'))):
+            entry = scan_directory(path, mtime)
+        new[path] = entry
+        if entry['project']:
+            found.append(path)
+        else:
+            todo.extend([os.path.join(path, n) for n in entry['dirs']])
+    if new != old:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix('.tmp{}'.format(os.getpid()))
+        with open(tmp, 'w') as f:
+            json.dump(new, f)
+        os.replace(tmp, cache_file)
+    return sorted(found)
+
+
+def scan_directory(path, mtime):
+    """
+    Return a dict describing the directory `path` for
+    :func:`discover_projects`.
+    """
+    entry = dict(mtime=mtime, dirs=[], tasks=None, project=False)
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        return entry
+    if any([e.name == 'pyvenv.cfg' for e in entries]):
+        return entry
+    for e in entries:
+        if e.name == 'tasks.py' and e.is_file():
+            entry['tasks'] = file_signature(e.path)
+            try:
+                with open(e.path) as f:
+                    entry['project'] = 'setup_from_tasks' in f.read()
+            except (OSError, ValueError):
+                pass
+        elif e.name not in PRUNE_DIRS and e.is_dir(follow_symlinks=False):
+            entry['dirs'].append(e.name)
+    entry['dirs'].sort()
+    return entry
@@ -0,0 +1,704 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2026 Rumma & Ko Ltd
+# License: BSD, see LICENSE for more details.
+
+"""
+Utilities used by the :cmd:`per_project` script for running a shell command
+in a series of projects.
+
+>>> from atelier.runner import select_projects
+>>> class P:
+...     def __init__(self, nickname):
+...         self.nickname = nickname
+...     def __repr__(self):
+...         return self.nickname
+>>> projects = [P(n) for n in "a b c d e".split()]
+>>> list(select_projects(projects))
+[a, b, c, d, e]
+>>> list(select_projects(projects, start="b", until="d"))
+[b, c, d]
+>>> list(select_projects(projects, after="b"))
+[c, d, e]
+
+>>> a, b, c, d, e = projects
+>>> graph = {a: set(), b: {a}, c: {a, b}, d: set(), e: {c}}
+>>> list(dependency_waves(projects, graph))
+[[a, d], [b], [c], [e]]
+
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import resource
+import shutil
+import tempfile
+import traceback
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+runs_dir = '~/.atelier/runs'
+
+TAIL_LINES = 20
+"""The number of output lines of a project to keep in memory."""
+
+MAX_LINE = 8192
+"""Longer output lines are split into chunks of this size."""
+
+
+def select_projects(projects, start=None, after=None, until=None):
+    """
+    Yield the items of `projects` that remain after applying the
+    :cmd:`per_project` options `--start`, `--after` and `--until`.
+    """
+    skipping = start is not None or after is not None
+    for prj in projects:
+        if start and prj.nickname == start:
+            skipping = False
+        if after and prj.nickname == after:
+            skipping = False
+            continue
+        if skipping:
+            continue
+        if until and prj.nickname == until:
+            skipping = True
+        yield prj
+
+
+INV_COMMANDS = ('inv', 'invoke')
+
+
+def is_inv_command(cmd):
+    """
+    Whether the given command (a list of strings) is an invocation of
+    :cmd:`inv`.
+
+    >>> is_inv_command(['inv', 'prep', 'test'])
+    True
+    >>> is_inv_command(['/usr/local/bin/invoke', 'bd'])
+    True
+    >>> is_inv_command(['git', 'pull'])
+    False
+    """
+    return len(cmd) > 0 and os.path.basename(cmd[0]) in INV_COMMANDS
+
+
+def run_tasks(prj, cmd):
+    """
+    Run the :cmd:`inv` command `cmd` (a list of strings) for the given
+    project in the current process and return its exit code.
+
+    The project's invoke namespace is loaded (if needed) by executing its
+    :xfile:`tasks.py` file, :attr:`atelier.current_project` is set to the
+    project, and the tasks are executed by invoke's `Program` and `Executor`
+    as if :cmd:`inv` had been run in the project's root directory.  The
+    current directory and the environment variables are restored afterwards.
+    """
+    import atelier
+    from invoke import Program
+    from atelier.projects import load_inv_namespace
+    atelier.current_project = None
+    if prj.inv_namespace is None:
+        ns = load_inv_namespace(prj.root_dir)
+        # setup_from_tasks() has set the namespace, but a plain tasks.py
+        # hasn't
+        if ns is not None and prj.inv_namespace is None:
+            prj.set_namespace(ns)
+    atelier.current_project = prj
+    if prj.inv_namespace is None:
+        print("No tasks.py file in {}".format(prj.root_dir))
+        return 1
+    program = Program(namespace=prj.inv_namespace,
+                      binary=os.path.basename(cmd[0]))
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+    os.chdir(prj.root_dir)
+    try:
+        program.run(list(cmd))
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code)
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+        atelier.current_project = None
+    return 0
+
+
+def is_isolated(prj):
+    """
+    Return `True` if the :cmd:`inv` commands of the given project must be run
+    in a separate process (see :envvar:`isolated_tasks`).
+
+    When the cached metadata of the project is outdated, it is updated in a
+    subprocess, so the :xfile:`tasks.py` of a project is never executed in
+    the current process before we know that this is allowed.  A project whose
+    metadata cannot be loaded is considered isolated.
+    """
+    info = prj.read_cache_file() or prj.read_info_in_subprocess()
+    if info is None:
+        return True
+    return bool(info['config'].get('isolated_tasks'))
+
+
+def requirement_name(req):
+    """
+    Return the normalized distribution name of the given requirement
+    specifier.
+
+    >>> requirement_name("lino>=20.1")
+    'lino'
+    >>> requirement_name("Lino_Noi [test] ; python_version>'3'")
+    'lino-noi'
+
+    """
+    name = re.split(r"[\s\[<>=!~;@(]", req.strip(), 1)[0]
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def dependency_graph(projects):
+    """
+    Return a dict that maps each of the given projects to the set of those
+    given projects it depends on.
+
+    A project depends on another project when the `install_requires` of its
+    :envvar:`SETUP_INFO` mentions the `name` of the other project.
+    """
+    by_name = dict()
+    for prj in projects:
+        name = prj.get_cached_info()['SETUP_INFO'].get('name')
+        if name:
+            by_name[requirement_name(name)] = prj
+    graph = dict()
+    for prj in projects:
+        info = prj.get_cached_info()['SETUP_INFO']
+        deps = set()
+        for req in info.get('install_requires', []):
+            dep = by_name.get(requirement_name(req))
+            if dep is not None and dep is not prj:
+                deps.add(dep)
+        graph[prj] = deps
+    return graph
+
+
+def dependency_waves(projects, graph):
+    """
+    Yield the given projects as a series of "waves" (lists of projects) so
+    that every project comes after all projects it depends on. The projects
+    of a same wave don't depend on each other and keep their original order.
+
+    `graph` is a dict as returned by :func:`dependency_graph`.
+    """
+    done = set()
+    todo = list(projects)
+    while todo:
+        wave = [p for p in todo if graph[p] <= done]
+        if not wave:
+            raise Exception("Dependency cycle between {}".format(
+                ', '.join([p.nickname for p in todo])))
+        yield wave
+        done.update(wave)
+        todo = [p for p in todo if p not in done]
+
+
+class ProjectRun(object):
+    """
+    Represents the execution of a shell command `cmd` (a list of strings) in
+    the root directory of a project `prj`.
+
+    .. attribute:: returncode
+
+        The exit code of the command, or `None` if it hasn't run.
+
+    .. attribute:: log_file
+
+        The file where the output of the command is written when it is
+        captured, or `None`.
+
+    .. attribute:: tail
+
+        A :class:`collections.deque` with the last :data:`TAIL_LINES` lines
+        of the captured output.
+
+    .. attribute:: cancelled
+
+        Whether the command has not been run because a project this project
+        depends on has failed.
+
+    .. attribute:: started
+
+        The time (in seconds since the epoch) when the command was started.
+
+    .. attribute:: duration
+
+        The wall time in seconds used by the command.
+
+    .. attribute:: user_time
+    .. attribute:: sys_time
+
+        The user and system CPU time in seconds used by the command.
+
+    .. attribute:: max_rss
+
+        The peak resident set size of the command in kilobytes, as reported
+        by the operating system.  This is never less than the peak resident
+        set size of the current process before the command was started,
+        because Linux counts the memory of the parent process at fork
+        time.  For a command run in-process, it is the peak of the current
+        process.
+
+    .. attribute:: fingerprint
+
+        The fingerprint of the project (see
+        :meth:`atelier.projects.Project.get_fingerprint`) taken just before
+        the command was started.
+
+    """
+    returncode = None
+    log_file = None
+    cancelled = False
+    started = None
+    duration = None
+    user_time = None
+    sys_time = None
+    max_rss = None
+    fingerprint = None
+
+    def __init__(self, prj, cmd, log_file=None):
+        self.prj = prj
+        self.cmd = cmd
+        self.log_file = log_file
+        self.tail = deque(maxlen=TAIL_LINES)
+
+    def __repr__(self):
+        return "{}({!r}, {!r})".format(
+            self.__class__.__name__, self.prj.nickname, self.returncode)
+
+    def run(self, capture=False, inprocess=False):
+        """Run the command and return its exit code.
+
+        If `capture` is True, stdout and stderr of the command are written to
+        :attr:`log_file` instead of the terminal, and the last lines are kept
+        in :attr:`tail`.  The memory used for this doesn't depend on the
+        volume of the output.
+
+        If `inprocess` is True, the command must be an :cmd:`inv` command,
+        which is then run by :func:`run_tasks` in the current process instead
+        of a subprocess.
+
+        """
+        # take the fingerprint before the command can modify the working
+        # tree, so that a change made during the run isn't hidden
+        self.fingerprint = self.prj.get_fingerprint()
+        self.started = time.time()
+        t0 = time.monotonic()
+        if inprocess:
+            ru0 = resource.getrusage(resource.RUSAGE_SELF)
+            self.returncode = run_tasks(self.prj, self.cmd)
+            ru = resource.getrusage(resource.RUSAGE_SELF)
+            self.user_time = ru.ru_utime - ru0.ru_utime
+            self.sys_time = ru.ru_stime - ru0.ru_stime
+            self.max_rss = ru.ru_maxrss
+        elif capture:
+            with open(self.log_file, 'wb') as log:
+                p = subprocess.Popen(
+                    self.cmd, cwd=self.prj.root_dir, stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT)
+                for line in iter(lambda: p.stdout.readline(MAX_LINE), b''):
+                    log.write(line)
+                    line = line.decode('utf-8', 'replace').rstrip()
+                    if line:
+                        self.tail.append(line)
+                p.stdout.close()
+                self.wait(p)
+        else:
+            self.wait(subprocess.Popen(self.cmd, cwd=self.prj.root_dir))
+        self.duration = time.monotonic() - t0
+        return self.returncode
+
+    def wait(self, p):
+        """Wait for the given :class:`subprocess.Popen` to terminate and
+        store its exit code and resource usage."""
+        try:
+            pid, status, ru = os.wait4(p.pid, 0)
+        except KeyboardInterrupt:
+            p.kill()
+            raise
+        p.returncode = self.returncode = os.waitstatus_to_exitcode(status)
+        self.user_time = ru.ru_utime
+        self.sys_time = ru.ru_stime
+        self.max_rss = ru.ru_maxrss
+
+    def get_record(self):
+        """Return a dict describing this run, suitable for serializing to
+        JSON.  See :attr:`max_rss` about the limits of `max_rss_kb`."""
+        return dict(
+            nickname=self.prj.nickname,
+            root_dir=str(self.prj.root_dir),
+            command=list(self.cmd),
+            exit_code=self.returncode,
+            cancelled=self.cancelled,
+            started=self.started,
+            wall_time=self.duration,
+            user_time=self.user_time,
+            sys_time=self.sys_time,
+            max_rss_kb=self.max_rss,
+            log_file=self.log_file)
+
+    def print_output(self, stream=None):
+        """Print the captured output as one block under a header."""
+        stream = stream or sys.stdout
+        stream.write("==== %s ====\n" % self.prj.nickname)
+        stream.flush()
+        if self.log_file is not None and os.path.exists(self.log_file):
+            with open(self.log_file, 'rb') as f:
+                last = b''
+                for chunk in iter(lambda: f.read(65536), b''):
+                    stream.buffer.write(chunk)
+                    last = chunk
+                if last and not last.endswith(b'\n'):
+                    stream.buffer.write(b'\n')
+            stream.buffer.flush()
+
+
+def make_run_dir():
+    """
+    Create and return a new directory below :xfile:`~/.atelier/runs` for the
+    log files of a :cmd:`per_project` run.  Remove the directories of older
+    runs except for the last :data:`atelier.history.KEEP_RUNS` ones.
+    """
+    from atelier.history import KEEP_RUNS
+    base = os.path.expanduser(runs_dir)
+    os.makedirs(base, exist_ok=True)
+    old = sorted(os.listdir(base))
+    for name in old[:max(0, len(old) - KEEP_RUNS + 1)]:
+        shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+    name = "{}-{}".format(time.strftime("%Y%m%d-%H%M%S"), os.getpid())
+    path = os.path.join(base, name)
+    os.makedirs(path)
+    return path
+
+
+class BlockDisplay(object):
+    """
+    Shows the progress of a parallel run by printing the output of every
+    project as a single block as soon as the command has terminated in that
+    project.
+    """
+
+    def __init__(self, runs, stream=None):
+        self.runs = runs
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+
+    def finished(self, run):
+        """Called when the command has terminated in a project."""
+        with self.lock:
+            run.print_output(self.stream)
+
+    def close(self):
+        """Called when all projects have been processed."""
+        pass
+
+
+class JsonDisplay(BlockDisplay):
+    """
+    Writes one JSON record (as returned by :meth:`ProjectRun.get_record`)
+    per line for every project in which the command has terminated or has
+    been cancelled.
+    """
+
+    def finished(self, run):
+        with self.lock:
+            self.stream.write(json.dumps(run.get_record()) + "\n")
+            self.stream.flush()
+
+    def close(self):
+        for r in self.runs:
+            if r.cancelled:
+                self.finished(r)
+
+
+class LiveDisplay(BlockDisplay):
+    """
+    Shows the progress of a parallel run as a dashboard at the bottom of
+    the terminal.  The dashboard has one line per running project with its
+    elapsed time and the last line of its output, and a line with the number
+    of completed and failed projects.  A line is printed above the dashboard
+    for every project that terminates.  When the command fails in a project,
+    its last lines of output are printed as well.
+    """
+    interval = 0.5
+
+    def __init__(self, runs, stream=None):
+        super(LiveDisplay, self).__init__(runs, stream)
+        self.drawn = 0
+        self.done = 0
+        self.failed = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.refresh, daemon=True)
+        self.thread.start()
+
+    def refresh(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                self.clear()
+                self.draw()
+
+    def clear(self):
+        if self.drawn:
+            self.stream.write("\x1b[{}F\x1b[J".format(self.drawn))
+            self.drawn = 0
+
+    def draw(self):
+        width = shutil.get_terminal_size().columns - 1
+        now = time.time()
+        lines = []
+        for r in self.runs:
+            if r.started is not None and r.duration is None:
+                last = r.tail[-1] if r.tail else ''
+                lines.append("  {} {:>5.0f}s {}".format(
+                    r.prj.nickname, now - r.started, last))
+        lines.append("[{}/{} completed, {} failed]".format(
+            self.done, len(self.runs), self.failed))
+        for ln in lines:
+            self.stream.write(ln[:width] + "\n")
+        self.stream.flush()
+        self.drawn = len(lines)
+
+    def finished(self, run):
+        with self.lock:
+            self.clear()
+            self.done += 1
+            if run.returncode:
+                self.failed += 1
+                self.stream.write("==== {} failed with exit code {} ({}) ====\n".format(
+                    run.prj.nickname, run.returncode, run.log_file))
+                for ln in run.tail:
+                    self.stream.write(ln + "\n")
+            else:
+                self.stream.write("==== {} ok ({:.1f}s) ====\n".format(
+                    run.prj.nickname, run.duration))
+            self.draw()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        with self.lock:
+            self.clear()
+            self.draw()
+
+
+def run_parallel(projects, cmd, jobs, estimates=None, callback=None,
+                 log_dir=None, display_class=None):
+    """
+    Run `cmd` in each of the given `projects` using a pool of at most `jobs`
+    worker threads.
+
+    The output of each project is captured into a log file in `log_dir` (a
+    temporary directory if `log_dir` is `None`).  The progress is shown
+    using an instance of `display_class` (:class:`BlockDisplay` by default,
+    or :class:`LiveDisplay` or :class:`JsonDisplay`).
+
+    `estimates` is an optional dict mapping the root directory of a project
+    (as a string) to the expected duration of `cmd` in that project. See
+    :func:`schedule`.
+
+    `callback` is an optional function to be called with each
+    :class:`ProjectRun` as soon as it has terminated.
+
+    Returns a list of :class:`ProjectRun` instances, in the same order as
+    `projects`.
+    """
+    runs = make_runs(projects, cmd, log_dir or tempfile.mkdtemp(
+        prefix='per_project-'))
+    display = (display_class or BlockDisplay)(runs)
+    try:
+        return run_pool(runs, jobs, estimates, callback, display)
+    finally:
+        display.close()
+
+
+def make_runs(projects, cmd, log_dir=None):
+    """Return a list of :class:`ProjectRun` instances, one for each project,
+    with their :attr:`log_file` in `log_dir` (if `log_dir` is given)."""
+    runs = []
+    for i, prj in enumerate(projects):
+        r = ProjectRun(prj, cmd)
+        if log_dir is not None:
+            r.log_file = os.path.join(
+                log_dir, "{:03d}-{}.log".format(i, prj.nickname))
+        runs.append(r)
+    return runs
+
+
+def schedule(runs, estimates=None):
+    """
+    Return the given :class:`ProjectRun` instances in the order in which they
+    should be started: those with the longest expected duration first, in
+    order to minimize the total duration of a parallel run.  Runs without
+    an estimate are started first because nothing is known about them.
+
+    >>> class P:
+    ...     def __init__(self, nickname):
+    ...         self.nickname = self.root_dir = nickname
+    >>> runs = [ProjectRun(P(n), ['ls']) for n in "abcd"]
+    >>> schedule(runs, {'a': 1, 'b': 5, 'c': 3})
+    [ProjectRun('d', None), ProjectRun('b', None), ProjectRun('c', None), ProjectRun('a', None)]
+
+    """
+    if not estimates:
+        return list(runs)
+    inf = float('inf')
+    return sorted(runs, key=lambda r: -estimates.get(str(r.prj.root_dir), inf))
+
+
+def run_pool(runs, jobs, estimates=None, callback=None, display=None):
+    """Execute the given :class:`ProjectRun` instances using a pool of at most
+    `jobs` worker threads and return them.
+
+    The runs are started in the order given by :func:`schedule`, but returned
+    in their original order. Every terminated run is passed to the
+    :meth:`finished <BlockDisplay.finished>` method of `display` (a
+    :class:`BlockDisplay` by default) and then to `callback`.
+
+    """
+    if display is None:
+        display = BlockDisplay(runs)
+    lock = threading.Lock()
+
+    def worker(r):
+        r.run(capture=True)
+        display.finished(r)
+        if callback is not None:
+            with lock:
+                callback(r)
+        return r
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(worker, schedule(runs, estimates)))
+    return runs
+
+
+def run_waves(projects, cmd, jobs=None, estimates=None, callback=None,
+              log_dir=None, display_class=None):
+    """
+    Run `cmd` in each of the given `projects`, respecting their dependencies.
+
+    The projects are processed in waves as yielded by
+    :func:`dependency_waves`.  All projects of a wave are run in parallel
+    (using at most `jobs` worker threads if `jobs` is given, and started in
+    the order given by :func:`schedule`).  When the command fails in a
+    project, then all projects that depend on it (directly or indirectly)
+    are cancelled.
+
+    The other arguments have the same meaning as for :func:`run_parallel`.
+
+    Returns a list of :class:`ProjectRun` instances, in the same order as
+    `projects`.
+
+    In the following example, `b` depends on `a`, `c` on `b`, `d` on `c`,
+    `e` on `a`, and `f` on nothing. The command fails in `b`:
+
+    >>> import tempfile
+    >>> class P:
+    ...     def __init__(self, nickname, *deps):
+    ...         self.nickname = nickname
+    ...         self.root_dir = tempfile.mkdtemp(prefix=nickname + '-')
+    ...         self.info = dict(SETUP_INFO=dict(
+    ...             name=nickname, install_requires=list(deps)))
+    ...     def get_cached_info(self):
+    ...         return self.info
+    ...     def get_fingerprint(self):
+    ...         return None
+    >>> projects = [P('a'), P('b', 'a'), P('c', 'b'), P('d', 'c'),
+    ...             P('e', 'a'), P('f')]
+    >>> class QuietDisplay(BlockDisplay):
+    ...     def finished(self, run):
+    ...         pass
+    >>> cmd = ['sh', '-c', 'case $(basename $PWD) in b-*) exit 3;; esac']
+    >>> for r in run_waves(projects, cmd, display_class=QuietDisplay):
+    ...     print(r.prj.nickname, r.returncode, r.cancelled)
+    a 0 False
+    b 3 False
+    c None True
+    d None True
+    e 0 False
+    f 0 False
+    >>> for p in projects:
+    ...     shutil.rmtree(p.root_dir)
+
+    """
+    graph = dependency_graph(projects)
+    runs = dict(zip(projects, make_runs(projects, cmd, log_dir or
+                                        tempfile.mkdtemp(prefix='per_project-'))))
+    display = (display_class or BlockDisplay)(list(runs.values()))
+    failed = set()
+    try:
+        for wave in dependency_waves(projects, graph):
+            todo = []
+            for prj in wave:
+                if graph[prj] & failed:
+                    runs[prj].cancelled = True
+                    failed.add(prj)
+                else:
+                    todo.append(prj)
+            if todo:
+                todo = [runs[prj] for prj in todo]
+                for r in run_pool(todo, jobs or len(todo), estimates,
+                                  callback, display):
+                    if r.returncode:
+                        failed.add(r.prj)
+    finally:
+        display.close()
+    return [runs[prj] for prj in projects]
+
+
+def unchanged_projects(projects, cmd, history):
+    """
+    Return a list of the given projects whose working tree hasn't changed
+    since the last successful execution of `cmd`, i.e. whose fingerprint is
+    the one stored in the given :class:`atelier.history.History`.
+
+    The fingerprints are computed concurrently.
+    """
+    def unchanged(prj):
+        fingerprint = prj.get_fingerprint()
+        if fingerprint is None:
+            return False
+        return fingerprint == history.get_fingerprint(cmd, prj.root_dir)
+
+    with ThreadPoolExecutor() as executor:
+        flags = list(executor.map(unchanged, projects))
+    return [prj for prj, flag in zip(projects, flags) if flag]
+
+
+def failed_runs(runs):
+    """Return a list of the runs that ended with a non-zero exit code."""
+    return [r for r in runs if r.returncode]
+
+
+def cancelled_runs(runs):
+    """Return a list of the runs that have been cancelled."""
+    return [r for r in runs if r.cancelled]
+
+
+def summary_rows(runs):
+    """Yield one `(nickname, exit code)` tuple for each run."""
+    for r in runs:
+        if r.cancelled:
+            yield (r.prj.nickname, "cancelled")
+        else:
+            yield (r.prj.nickname, str(r.returncode))
@@ -27,7 +27,8 @@ SETUP_INFO = dict(
     version='1.1.28',
     install_requires=install_requires,
     tests_require=tests_require,
-    scripts=['scripts/per_project'],
+    scripts=['scripts/per_project', 'scripts/atelierd', 'scripts/invd',
+             'scripts/winv'],
     description="A collection of tools for software artists",
     license='BSD-2-Clause',
     test_suite='tests',
@@ -0,0 +1,663 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2026 Rumma & Ko Ltd
+# License: BSD, see LICENSE for more details.
+
+"""
+Reads the :envvar:`SETUP_INFO` of a project from its :xfile:`setup.py`
+file without executing it.
+
+The :xfile:`setup.py` file is parsed into an abstract syntax tree, which is
+then evaluated by a small interpreter that understands only the statements
+and expressions commonly used to define :envvar:`SETUP_INFO`: assignments,
+literals, calls to :func:`dict` and a few other builtins, some methods of
+dicts, lists and strings (like :meth:`dict.update` or
+:meth:`str.splitlines`), comprehensions, functions defined in the file
+itself, ``if __name__ == '__main__':`` blocks and the
+``exec(compile(open(fn).read(), fn, 'exec'))`` idiom used to load a
+:file:`setup_info.py` file.  Import statements are accepted, but the
+imported names are unknown.  Anything else raises :class:`NotStatic`.
+
+>>> from atelier.setupreader import evaluate
+>>> ns = evaluate('''
+... from setuptools import setup
+... install_requires = ['invoke']
+... install_requires.append('argh')
+... SETUP_INFO = dict(name='foo', install_requires=install_requires)
+... SETUP_INFO.update(packages=[n for n in "foo foo.bar".split() if n])
+... if __name__ == '__main__':
+...     setup(**SETUP_INFO)
+... ''')
+>>> ns['SETUP_INFO'] == {'name': 'foo', 'install_requires': ['invoke', 'argh'],
+...     'packages': ['foo', 'foo.bar']}
+True
+
+>>> evaluate('''
+... import sys
+... SETUP_INFO = dict(name='foo', python=sys.version)
+... ''')
+Traceback (most recent call last):
+...
+atelier.setupreader.NotStatic: <string>:3: cannot access attributes of an unknown value
+
+Any other operation on an imported value raises :class:`NotStatic` as well:
+
+>>> evaluate('''
+... from reqs import REQS
+... install_requires = []
+... install_requires += REQS
+... ''')
+Traceback (most recent call last):
+...
+atelier.setupreader.NotStatic: <string>:4: unsupported value <unknown reqs.REQS>
+>>> evaluate('''
+... from reqs import REQS, EXTRA
+... SETUP_INFO = dict(install_requires=[*REQS], **EXTRA)
+... ''')
+Traceback (most recent call last):
+...
+atelier.setupreader.NotStatic: <string>:3: cannot iterate over <unknown reqs.REQS>
+>>> evaluate("SETUP_INFO = {'name': 'foo'}; del SETUP_INFO['url']")
+Traceback (most recent call last):
+...
+atelier.setupreader.NotStatic: <string>:1: KeyError: 'url'
+
+"""
+
+import ast
+import types
+import operator
+from pathlib import Path
+
+MAX_DEPTH = 50
+"""The maximum nesting depth of function calls and executed files."""
+
+
+class NotStatic(Exception):
+    """
+    Raised when a file cannot be evaluated statically.
+    """
+
+
+class Unknown(object):
+    """
+    The value of a name that has been imported (or otherwise defined in a
+    way that cannot be evaluated statically).
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "<unknown %s>" % self.name
+
+
+class Function(object):
+    """A function defined in the evaluated file."""
+
+    def __init__(self, node, evaluator):
+        self.node = node
+        self.evaluator = evaluator
+
+
+class File(object):
+    """A file opened for reading by the evaluated file."""
+
+    def __init__(self, path, mode):
+        self.path = path
+        self.mode = mode
+
+    def read(self):
+        if 'b' in self.mode:
+            return self.path.read_bytes()
+        return self.path.read_text()
+
+
+class Code(object):
+    """A code object returned by :func:`compile`."""
+
+    def __init__(self, tree, filename):
+        self.tree = tree
+        self.filename = filename
+
+
+class Return(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+SAFE_BUILTINS = {
+    f.__name__: f for f in (
+        dict, list, tuple, set, frozenset, str, bytes, int, float, bool,
+        len, sorted, reversed, enumerate, zip, range, min, max, any, all,
+        isinstance, repr)}
+
+SAFE_METHODS = {
+    dict: {'update', 'get', 'setdefault', 'copy', 'keys', 'values', 'items',
+           'pop'},
+    list: {'append', 'extend', 'insert', 'copy', 'index', 'count', 'remove',
+           'sort', 'reverse', 'pop'},
+    str: {'splitlines', 'split', 'strip', 'lstrip', 'rstrip', 'format',
+          'join', 'replace', 'lower', 'upper', 'startswith', 'endswith',
+          'encode'},
+    bytes: {'decode', 'splitlines', 'strip'},
+    File: {'read'},
+}
+
+BINOPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod, ast.BitOr: operator.or_}
+
+CMPOPS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt,
+    ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.Is: operator.is_, ast.IsNot: operator.is_not,
+    ast.In: lambda a, b: a in b, ast.NotIn: lambda a, b: a not in b}
+
+
+def find_unknown(value):
+    """
+    Return the first value in `value` (which may be a nested structure of
+    dicts, lists, tuples and sets) that cannot be used outside of the
+    evaluator, or `None` if there is no such value.
+
+    >>> print(find_unknown({'a': [1, ('b', {2})]}))
+    None
+    >>> find_unknown({'a': [1, Unknown('foo.bar')]})
+    <unknown foo.bar>
+    """
+    if isinstance(value, (Unknown, Function, File, Code)):
+        return value
+    if isinstance(value, dict):
+        value = list(value.keys()) + list(value.values())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        for v in value:
+            v = find_unknown(v)
+            if v is not None:
+                return v
+    return None
+
+
+class Evaluator(object):
+    """
+    Evaluates Python source code statically.  Relative file names are
+    resolved against `root_dir`.
+
+    `known` is an optional dict mapping qualified names (like
+    ``'atelier.projects.add_project'``) to the values to use when these
+    names are imported.  When `strict` is True, importing any other name
+    raises :class:`NotStatic` because the imported module might have side
+    effects.
+
+    >>> from atelier.setupreader import Evaluator
+    >>> found = []
+    >>> ev = Evaluator(known={'atelier.projects.add_project': found.append},
+    ...                strict=True)
+    >>> ev.run_code(ev.compile('''
+    ... from atelier.projects import add_project
+    ... add_project('/foo')
+    ... import mysettings
+    ... ''', 'config.py'))
+    Traceback (most recent call last):
+    ...
+    atelier.setupreader.NotStatic: config.py:4: cannot import mysettings
+    >>> found
+    ['/foo']
+    """
+
+    def __init__(self, root_dir='.', known=None, strict=False):
+        self.root_dir = Path(root_dir)
+        self.known = known or {}
+        self.strict = strict
+        self.globals = {'__name__': 'not_main'}
+        self.scopes = [self.globals]
+        self.depth = 0
+        self.filename = None
+        self.lineno = None
+
+    def fail(self, msg):
+        raise NotStatic("{}:{}: {}".format(self.filename, self.lineno, msg))
+
+    def run_file(self, filename):
+        path = self.root_dir / filename
+        try:
+            source = path.read_bytes()
+        except OSError as e:
+            self.fail(str(e))
+        self.run_code(self.compile(source, str(filename)))
+        return self.globals
+
+    def compile(self, source, filename):
+        try:
+            return Code(ast.parse(source, filename), filename)
+        except SyntaxError as e:
+            self.fail(str(e))
+
+    def run_code(self, code):
+        if self.depth >= MAX_DEPTH:
+            self.fail("too deeply nested")
+        saved = self.filename, self.lineno
+        self.filename = code.filename
+        self.depth += 1
+        try:
+            self.run_body(code.tree.body)
+        finally:
+            self.depth -= 1
+            self.filename, self.lineno = saved
+
+    def run_body(self, body):
+        for node in body:
+            self.lineno = node.lineno
+            meth = getattr(self, 'exec_' + node.__class__.__name__, None)
+            if meth is None:
+                self.fail("unsupported statement {}".format(
+                    node.__class__.__name__))
+            try:
+                meth(node)
+            except (NotStatic, Return):
+                raise
+            except Exception as e:
+                # an operation not covered by call() failed
+                self.fail("{}: {}".format(e.__class__.__name__, e))
+
+    # statements
+
+    def exec_Expr(self, node):
+        self.eval(node.value)
+
+    def exec_Pass(self, node):
+        pass
+
+    def exec_Import(self, node):
+        for alias in node.names:
+            if self.strict:
+                self.fail("cannot import {}".format(alias.name))
+            name = alias.asname or alias.name.split('.')[0]
+            self.scopes[-1][name] = Unknown(alias.name)
+
+    def exec_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                self.fail("cannot import *")
+            name = "{}.{}".format(node.module, alias.name)
+            if self.strict and name not in self.known:
+                self.fail("cannot import {}".format(name))
+            value = self.known.get(name, Unknown(name))
+            self.scopes[-1][alias.asname or alias.name] = value
+
+    def exec_Assign(self, node):
+        value = self.eval(node.value)
+        for target in node.targets:
+            self.assign(target, value)
+
+    def exec_AnnAssign(self, node):
+        if node.value is not None:
+            self.assign(node.target, self.eval(node.value))
+
+    def exec_AugAssign(self, node):
+        if not isinstance(node.target, ast.Name):
+            self.fail("unsupported augmented assignment")
+        op = BINOPS.get(node.op.__class__)
+        if op is None:
+            self.fail("unsupported operator")
+        old = self.lookup(node.target.id)
+        value = self.eval(node.value)
+        if isinstance(old, list) and isinstance(node.op, ast.Add):
+            self.call(operator.iadd, old, value)
+        else:
+            self.assign(node.target, self.call(op, old, value))
+
+    def exec_If(self, node):
+        if self.truth(self.eval(node.test)):
+            self.run_body(node.body)
+        else:
+            self.run_body(node.orelse)
+
+    def exec_For(self, node):
+        for item in self.iterate(self.eval(node.iter)):
+            self.assign(node.target, item)
+            self.run_body(node.body)
+        self.run_body(node.orelse)
+
+    def exec_Try(self, node):
+        # assume that the body does not raise an exception
+        self.run_body(node.body)
+        self.run_body(node.orelse)
+        self.run_body(node.finalbody)
+
+    def exec_With(self, node):
+        for item in node.items:
+            value = self.eval(item.context_expr)
+            if not isinstance(value, File):
+                self.fail("unsupported context manager")
+            if item.optional_vars is not None:
+                self.assign(item.optional_vars, value)
+        self.run_body(node.body)
+
+    def exec_FunctionDef(self, node):
+        if node.decorator_list:
+            self.fail("unsupported decorator")
+        self.scopes[-1][node.name] = Function(node, self)
+
+    def exec_Return(self, node):
+        if len(self.scopes) == 1:
+            self.fail("return outside function")
+        raise Return(None if node.value is None else self.eval(node.value))
+
+    def exec_Delete(self, node):
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                self.scopes[-1].pop(target.id, None)
+            elif isinstance(target, ast.Subscript):
+                self.call(operator.delitem, self.eval(target.value),
+                          self.eval(target.slice))
+            else:
+                self.fail("unsupported del statement")
+
+    def assign(self, target, value):
+        if isinstance(target, ast.Name):
+            self.scopes[-1][target.id] = value
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            values = list(self.iterate(value))
+            if len(values) != len(target.elts):
+                self.fail("cannot unpack")
+            for t, v in zip(target.elts, values):
+                self.assign(t, v)
+        elif isinstance(target, ast.Subscript):
+            obj = self.eval(target.value)
+            if not isinstance(obj, (dict, list)):
+                self.fail("unsupported item assignment")
+            obj[self.eval(target.slice)] = value
+        else:
+            self.fail("unsupported assignment")
+
+    def check(self, value):
+        if isinstance(value, (Unknown, Function, File, Code)):
+            self.fail("unsupported value {!r}".format(value))
+        return value
+
+    def truth(self, value):
+        return bool(self.check(value))
+
+    def iterate(self, value):
+        if not isinstance(value, (list, tuple, set, frozenset, dict, str,
+                                  bytes, range, types.GeneratorType)):
+            self.fail("cannot iterate over {!r}".format(value))
+        return iter(value)
+
+    def lookup(self, name):
+        for scope in (self.scopes[-1], self.globals):
+            if name in scope:
+                return scope[name]
+        if name in SAFE_BUILTINS:
+            return SAFE_BUILTINS[name]
+        if name in ('open', 'compile', 'exec'):
+            return getattr(self, 'builtin_' + name)
+        self.fail("unknown name {}".format(name))
+
+    # builtins with a special meaning
+
+    def builtin_open(self, fn, mode='r', *args, **kwargs):
+        if not isinstance(fn, (str, Path)) or set(mode) - set('rbt'):
+            self.fail("unsupported call to open()")
+        return File(self.root_dir / fn, mode)
+
+    def builtin_compile(self, source, filename, mode, *args, **kwargs):
+        if mode != 'exec':
+            self.fail("unsupported call to compile()")
+        return self.compile(source, filename)
+
+    def builtin_exec(self, code, *args):
+        if args:
+            self.fail("unsupported call to exec()")
+        if not isinstance(code, Code):
+            code = self.compile(code, '<string>')
+        self.run_code(code)
+
+    # expressions
+
+    def eval(self, node):
+        meth = getattr(self, 'eval_' + node.__class__.__name__, None)
+        if meth is None:
+            self.fail("unsupported expression {}".format(
+                node.__class__.__name__))
+        return meth(node)
+
+    def eval_Constant(self, node):
+        return node.value
+
+    def eval_Name(self, node):
+        return self.lookup(node.id)
+
+    def eval_JoinedStr(self, node):
+        return ''.join([self.eval(v) for v in node.values])
+
+    def eval_FormattedValue(self, node):
+        value = self.eval(node.value)
+        if node.conversion == ord('r'):
+            value = repr(value)
+        elif node.conversion == ord('s'):
+            value = str(value)
+        spec = '' if node.format_spec is None else self.eval(node.format_spec)
+        return self.call(format, value, spec)
+
+    def eval_List(self, node):
+        return self.eval_items(node.elts)
+
+    def eval_Tuple(self, node):
+        return tuple(self.eval_items(node.elts))
+
+    def eval_Set(self, node):
+        return set(self.eval_items(node.elts))
+
+    def eval_items(self, elts):
+        rv = []
+        for elt in elts:
+            if isinstance(elt, ast.Starred):
+                rv.extend(self.iterate(self.eval(elt.value)))
+            else:
+                rv.append(self.eval(elt))
+        return rv
+
+    def eval_Dict(self, node):
+        rv = {}
+        for k, v in zip(node.keys, node.values):
+            if k is None:
+                self.call(rv.update, self.eval(v))
+            else:
+                rv[self.eval(k)] = self.eval(v)
+        return rv
+
+    def eval_BinOp(self, node):
+        op = BINOPS.get(node.op.__class__)
+        if op is None:
+            self.fail("unsupported operator")
+        return self.call(op, self.eval(node.left), self.eval(node.right))
+
+    def eval_UnaryOp(self, node):
+        value = self.eval(node.operand)
+        if isinstance(node.op, ast.Not):
+            return not self.truth(value)
+        if isinstance(node.op, ast.USub):
+            return self.call(operator.neg, value)
+        self.fail("unsupported operator")
+
+    def eval_BoolOp(self, node):
+        value = None
+        for v in node.values:
+            value = self.eval(v)
+            if isinstance(node.op, ast.And) != self.truth(value):
+                return value
+        return value
+
+    def eval_Compare(self, node):
+        left = self.eval(node.left)
+        for op, right in zip(node.ops, node.comparators):
+            right = self.eval(right)
+            if not self.call(CMPOPS[op.__class__], left, right):
+                return False
+            left = right
+        return True
+
+    def eval_IfExp(self, node):
+        if self.truth(self.eval(node.test)):
+            return self.eval(node.body)
+        return self.eval(node.orelse)
+
+    def eval_Subscript(self, node):
+        return self.call(operator.getitem, self.eval(node.value),
+                         self.eval(node.slice))
+
+    def eval_Index(self, node):  # Python < 3.9
+        return self.eval(node.value)
+
+    def eval_Slice(self, node):
+        return slice(*[None if n is None else self.eval(n)
+                       for n in (node.lower, node.upper, node.step)])
+
+    def eval_Attribute(self, node):
+        obj = self.eval(node.value)
+        if isinstance(obj, Unknown):
+            self.fail("cannot access attributes of an unknown value")
+        if node.attr not in SAFE_METHODS.get(type(obj), ()):
+            self.fail("unsupported attribute {}".format(node.attr))
+        return getattr(obj, node.attr)
+
+    def eval_Call(self, node):
+        func = self.eval(node.func)
+        args = self.eval_items(node.args)
+        kwargs = {}
+        for kw in node.keywords:
+            if kw.arg is None:
+                self.call(kwargs.update, self.eval(kw.value))
+            else:
+                kwargs[kw.arg] = self.eval(kw.value)
+        if isinstance(func, Function):
+            return self.call_function(func, args, kwargs)
+        if isinstance(func, types.MethodType) and func.__self__ is self:
+            return func(*args, **kwargs)
+        if isinstance(func, Unknown):
+            self.fail("cannot call {}".format(func.name))
+        return self.call(func, *args, **kwargs)
+
+    def call(self, func, *args, **kwargs):
+        for a in list(args) + list(kwargs.values()):
+            self.check(a)
+        try:
+            return func(*args, **kwargs)
+        except NotStatic:
+            raise
+        except Exception as e:
+            self.fail("{}: {}".format(e.__class__.__name__, e))
+
+    def call_function(self, func, args, kwargs):
+        a = func.node.args
+        if a.kwonlyargs or a.kwarg or getattr(a, 'posonlyargs', None):
+            self.fail("unsupported function signature")
+        if self.depth >= MAX_DEPTH:
+            self.fail("too deeply nested")
+        names = [arg.arg for arg in a.args]
+        defaults = [self.eval(d) for d in a.defaults]
+        scope = dict(zip(names[len(names) - len(defaults):], defaults))
+        scope.update(zip(names, args))
+        extra = args[len(names):]
+        if a.vararg is not None:
+            scope[a.vararg.arg] = tuple(extra)
+        elif extra:
+            self.fail("too many arguments")
+        for k, v in kwargs.items():
+            if k not in names:
+                self.fail("unexpected argument {}".format(k))
+            scope[k] = v
+        if len(set(scope) & set(names)) != len(names):
+            self.fail("missing arguments")
+        self.scopes.append(scope)
+        self.depth += 1
+        try:
+            self.run_body(func.node.body)
+        except Return as r:
+            return r.value
+        finally:
+            self.depth -= 1
+            self.scopes.pop()
+
+    def eval_comprehension(self, generators, element):
+        rv = []
+        self.scopes.append(dict(self.scopes[-1]))
+
+        def loop(i):
+            if i == len(generators):
+                rv.append(element())
+                return
+            gen = generators[i]
+            if gen.is_async:
+                self.fail("unsupported comprehension")
+            for item in self.iterate(self.eval(gen.iter)):
+                self.assign(gen.target, item)
+                if all([self.truth(self.eval(cond)) for cond in gen.ifs]):
+                    loop(i + 1)
+        try:
+            loop(0)
+        finally:
+            self.scopes.pop()
+        return rv
+
+    def eval_ListComp(self, node):
+        return self.eval_comprehension(
+            node.generators, lambda: self.eval(node.elt))
+
+    def eval_GeneratorExp(self, node):
+        return tuple(self.eval_ListComp(node))
+
+    def eval_SetComp(self, node):
+        return set(self.eval_ListComp(node))
+
+    def eval_DictComp(self, node):
+        return dict(self.eval_comprehension(
+            node.generators,
+            lambda: (self.eval(node.key), self.eval(node.value))))
+
+
+def evaluate(source, root_dir='.', filename='<string>'):
+    """
+    Statically evaluate the given Python source code and return its global
+    namespace. Raise :class:`NotStatic` if that is not possible.
+    """
+    ev = Evaluator(root_dir)
+    ev.filename = filename
+    ev.run_code(ev.compile(source, filename))
+    return ev.globals
+
+
+def read_setup_info(root_dir):
+    """
+    Statically evaluate the :xfile:`setup.py` file in the given project root
+    directory and return its :envvar:`SETUP_INFO`, or `None` if it doesn't
+    define that name.  Raise :class:`NotStatic` if the file cannot be
+    evaluated statically, including when :envvar:`SETUP_INFO` contains an
+    imported value.  In that case :func:`atelier.projects.load_setup_info`
+    falls back to executing the file:
+
+    >>> import tempfile
+    >>> from pathlib import Path
+    >>> from atelier.setupreader import read_setup_info
+    >>> from atelier.projects import load_setup_info
+    >>> root_dir = Path(tempfile.mkdtemp())
+    >>> _ = (root_dir / 'alpha_version.py').write_text("REQ = 'invoke'")
+    >>> _ = (root_dir / 'setup.py').write_text('''
+    ... from alpha_version import REQ
+    ... SETUP_INFO = {'name': 'alpha', 'install_requires': [REQ]}
+    ... ''')
+    >>> read_setup_info(root_dir)
+    Traceback (most recent call last):
+    ...
+    atelier.setupreader.NotStatic: setup.py: SETUP_INFO contains <unknown alpha_version.REQ>
+    >>> load_setup_info(root_dir)
+    ({'name': 'alpha', 'install_requires': ['invoke']}, 'exec')
+
+    """
+    info = Evaluator(root_dir).run_file('setup.py').get('SETUP_INFO')
+    unknown = find_unknown(info)
+    if unknown is not None:
+        raise NotStatic("setup.py: SETUP_INFO contains {!r}".format(unknown))
+    return info
@@ -34,6 +34,12 @@ Usage example:
 >>> shell = Sheller(os.path.dirname(__file__))
 >>> shell('ls -S *.py')
 projects.py
+runner.py
+setupreader.py
+taskd.py
+history.py
+daemon.py
+profiler.py
 test.py
 utils.py
 setup_info.py
@@ -350,3 +350,4 @@ def setup(app):
     app.add_config_value(
         'blogref_format',
         "http://luc.lino-framework.org/blog/%Y/%m%d.html", 'html')
+    return dict(parallel_read_safe=True, parallel_write_safe=True)
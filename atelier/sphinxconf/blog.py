@@ -94,16 +94,18 @@ class BloggerYear(object):
 
     """
 
-    def __init__(self, env):
+    def __init__(self, env, docname=None):
         """
         :docname: the name of the document containing the `main_blogindex` directive
         :starting_year: all years before this year will be pruned
         """
 
-        blogname, year, index = env.docname.rsplit('/', 3)
+        docname = docname or env.docname
+        blogname, year, index = docname.rsplit('/', 3)
         if index != 'index':
             raise Exception(
                 "Allowed only in /<blogname>/<year>/index.rst files")
+        self.docname = docname
         self.blogname = blogname
         self.year = int(year)
 
@@ -113,7 +115,7 @@ class BloggerYear(object):
         self.dates = set()
         #~ self.years = set()
         #~ self.starting_year = int(starting_year)
-        top = os.path.dirname(env.doc2path(env.docname))
+        top = os.path.dirname(env.doc2path(docname))
         #~ print top
         for (dirpath, dirnames, filenames) in os.walk(top):
             del dirnames[:]  # don't descend another level
@@ -167,7 +169,7 @@ def navigator(years, current):
 
 
 def get_all_entries(env):
-
+    collect_blogger_years(env)
     blog_instances = getattr(env, 'blog_instances', dict())
     entries = []
     for blogname, blog in blog_instances.items():
@@ -184,7 +186,30 @@ def get_all_entries(env):
     return reversed(entries)
 
 
+def collect_blogger_years(env):
+    """
+    Create a :class:`BloggerYear` for every :rst:dir:`blogger_year` document
+    that hasn't yet been read.  The order in which Sphinx reads the documents
+    is not defined in a parallel build, so an index must not rely on having
+    been read after the yearly index files.
+    """
+    if not hasattr(env, 'blog_instances'):
+        env.blog_instances = dict()
+    for docname in sorted(env.found_docs):
+        parts = docname.split('/')
+        if len(parts) != 3 or parts[2] != 'index' or not (
+                len(parts[1]) == 4 and parts[1].isdigit()):
+            continue
+        if int(parts[1]) in env.blog_instances.get(parts[0], dict()):
+            continue
+        with open(env.doc2path(docname), encoding='utf-8') as f:
+            if 'blogger_year::' not in f.read():
+                continue
+        BloggerYear(env, docname)
+
+
 def get_blogger_years(env, blogname):
+    collect_blogger_years(env)
     blog_instances = getattr(env, 'blog_instances', dict())
     blog = blog_instances.get(blogname)
     if blog is None:
@@ -342,6 +367,23 @@ class LatestEntriesDirective(InsertInputDirective):
         return text
 
 
+def purge_blog_instances(app, env, docname):
+    """Forget the :class:`BloggerYear` defined in the given document."""
+    for years in getattr(env, 'blog_instances', dict()).values():
+        for year, y in list(years.items()):
+            if y.docname == docname:
+                del years[year]
+
+
+def merge_blog_instances(app, env, docnames, other):
+    """Merge the :class:`BloggerYear` instances collected by a parallel
+    reader process."""
+    if not hasattr(env, 'blog_instances'):
+        env.blog_instances = dict()
+    for blogname, years in getattr(other, 'blog_instances', dict()).items():
+        env.blog_instances.setdefault(blogname, dict()).update(years)
+
+
 def setup(app):
     #~ app.add_node(blogindex)
     #~ app.add_node(blogindex,html=(visit_blogindex,depart_blogindex))
@@ -350,3 +392,6 @@ def setup(app):
     app.add_directive('blogger_year', YearBlogIndexDirective)
     app.add_directive('blogger_index', MainBlogIndexDirective)
     app.add_directive('blogger_latest', LatestEntriesDirective)
+    app.connect('env-purge-doc', purge_blog_instances)
+    app.connect('env-merge-info', merge_blog_instances)
+    return dict(parallel_read_safe=True, parallel_write_safe=True)
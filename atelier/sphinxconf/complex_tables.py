@@ -151,3 +151,4 @@ def setup(app):
     app.add_directive(str('textimage'), TextImageDirective)
     app.add_directive(str('complextable'), ComplexTableDirective)
     app.add_directive(str('cards'), CardsDirective)
+    return dict(parallel_read_safe=True, parallel_write_safe=True)
@@ -242,3 +242,4 @@ class Py2rstDirective(InsertInputDirective):
 
 def setup(app):
     app.add_directive('py2rst', Py2rstDirective)
+    return dict(parallel_read_safe=True, parallel_write_safe=True)
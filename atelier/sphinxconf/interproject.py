@@ -17,6 +17,7 @@ from sphinx.util import logging ; logger = logging.getLogger(__name__)
 # import atelier
 from atelier.projects import load_projects, get_project_info_from_mod
 from atelier.projects import get_project_from_nickname
+from atelier.projects import get_project_from_path
 
 
 USE_LOCAL_BUILDS = os.environ.get("ATELIER_IGNORE_LOCAL_BUILDS", "") != "yes"
@@ -51,13 +52,8 @@ def configure(globals_dict, prjspec=None, **nicknames):
         prjlist = [get_project_info_from_mod(n) for n in prjspec]
 
     else:
-        prjlist = []
-        # for p in load_projects():
-        for p in reversed(list(load_projects())):
-            if str(this_conf_file).startswith(str(p.root_dir)):
-                # print("20190122 {} startswith  {}".format(this_conf_file, p.root_dir))
-                continue
-            prjlist.append(p)
+        this = get_project_from_path(this_conf_file)
+        prjlist = [p for p in reversed(list(load_projects())) if p is not this]
 
     for k, v in nicknames.items():
         p = get_project_from_nickname(k)
@@ -127,3 +127,6 @@ class RefsToThis(InsertInputDirective):
 
 def setup(app):
     app.add_directive('refstothis', RefsToThis)
+    # The directive reads the doctrees of other documents while reading its
+    # own document, so Sphinx must not read documents in parallel.
+    return dict(parallel_read_safe=False, parallel_write_safe=True)
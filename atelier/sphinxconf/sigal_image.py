@@ -232,3 +232,4 @@ def setup(app):
     #     lowercase=True,
     #     innernodeclass=nodes.emphasis,
     #     warn_dangling=True))
+    return dict(parallel_read_safe=True, parallel_write_safe=True)
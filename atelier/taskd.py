@@ -0,0 +1,397 @@
+# -*- coding: UTF-8 -*-
+# Copyright 2026 Rumma & Ko Ltd
+# License: BSD, see LICENSE for more details.
+
+"""
+The warm task daemon :cmd:`invd` and its client :cmd:`winv`.
+
+The daemon loads the :xfile:`tasks.py` of a project once and then waits for
+requests on a Unix socket below :xfile:`~/.atelier/taskd`.  For every
+request it forks a child process, which redirects its standard input, output
+and error to the socket and runs :cmd:`inv` with the given arguments.  When
+the task has finished, the child process sends a trailer with the exit code.
+So the interpreter startup, the imports, the execution of the
+:xfile:`tasks.py` and (in a Lino project) the import of the Django settings
+happen only once.
+
+When a request comes in, the daemon first checks whether the
+:xfile:`tasks.py` or the :xfile:`setup_info.py` of the project have changed
+since it loaded them, and if so, it replaces itself by a new daemon, which
+inherits the listening socket and the pending request.
+
+The trailer is always the last line of the output:
+
+>>> from atelier.taskd import split_trailer, TRAILER
+>>> split_trailer(b"Hello\\n" + TRAILER + b"3\\n")
+(b'Hello\\n', 3)
+>>> split_trailer(b"Hello\\n")
+(b'Hello\\n', None)
+
+"""
+
+import os
+import re
+import sys
+import json
+import signal
+import socket
+import hashlib
+import threading
+import traceback
+from pathlib import Path
+
+socket_dir = '~/.atelier/taskd'
+
+TRAILER = b"\0invd-exit-code:"
+TRAILER_RE = re.compile(rb"\0invd-exit-code:(-?\d+)\n$")
+TRAILER_MAX = len(TRAILER) + 12
+
+FDS_VARIABLE = 'ATELIER_TASKD_FDS'
+"""The environment variable used to pass the listening socket and the
+pending connection to a new daemon."""
+
+
+def find_root(start):
+    """
+    Return the nearest directory containing a :xfile:`tasks.py` file,
+    starting at `start` and walking up like :cmd:`inv` does, or `None`.
+    """
+    p = Path(start).absolute()
+    for d in [p] + list(p.parents):
+        if (d / 'tasks.py').exists():
+            return d
+    return None
+
+
+def get_socket_file(root_dir):
+    h = hashlib.sha1(str(root_dir).encode()).hexdigest()[:12]
+    return os.path.join(os.path.expanduser(socket_dir), h + '.sock')
+
+
+def split_trailer(data):
+    """
+    Split the given output into the output of the task and its exit code.
+    The exit code is `None` when there is no trailer.
+    """
+    m = TRAILER_RE.search(data)
+    if m is None:
+        return data, None
+    return data[:m.start()], int(m.group(1))
+
+
+def connect(root_dir):
+    fn = get_socket_file(root_dir)
+    if not os.path.exists(fn):
+        return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(fn)
+    except OSError:
+        s.close()
+        return None
+    return s
+
+
+def query(root_dir, name):
+    """
+    Send the query `name` ("ping" or "stop") to the :cmd:`invd` of the
+    project in `root_dir` and return its answer (a dict), or `None` if no
+    daemon is running for that project.
+    """
+    s = connect(root_dir)
+    if s is None:
+        return None
+    try:
+        s.sendall(json.dumps(dict(query=name)).encode() + b"\n")
+        with s.makefile('rb') as f:
+            line = f.readline()
+    except OSError:
+        return None
+    finally:
+        s.close()
+    if not line:
+        return None
+    return json.loads(line.decode())
+
+
+def copy_stdin(s):
+    try:
+        while True:
+            data = os.read(0, 4096)
+            if not data:
+                break
+            s.sendall(data)
+        s.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+
+
+def forward(argv, cwd=None, stdout=None):
+    """
+    Run :cmd:`inv` with the given arguments in the :cmd:`invd` of the project
+    containing `cwd`.  Write the output of the task to `stdout` (a binary
+    stream) and return its exit code, or `None` if no daemon is running for
+    that project.
+    """
+    cwd = cwd or os.getcwd()
+    stdout = stdout or sys.stdout.buffer
+    root_dir = find_root(cwd)
+    if root_dir is None:
+        return None
+    s = connect(root_dir)
+    if s is None:
+        return None
+    request = dict(query='run', argv=list(argv), cwd=str(cwd),
+                   env=dict(os.environ))
+    tail = b''
+    try:
+        s.sendall(json.dumps(request).encode() + b"\n")
+        threading.Thread(target=copy_stdin, args=(s,), daemon=True).start()
+        while True:
+            try:
+                chunk = s.recv(65536)
+            except ConnectionResetError:
+                # the task exited without reading all our standard input
+                break
+            if not chunk:
+                break
+            data = tail + chunk
+            keep = max(0, len(data) - TRAILER_MAX)
+            stdout.write(data[:keep])
+            stdout.flush()
+            tail = data[keep:]
+    finally:
+        s.close()
+    output, code = split_trailer(tail)
+    stdout.write(output)
+    stdout.flush()
+    if code is None:
+        sys.stderr.write("Lost connection to invd\n")
+        return 1
+    return code
+
+
+def make_program():
+    from invoke import Program, Collection, __version__
+
+    class WarmProgram(Program):
+        """An invoke program that uses the already loaded tasks module
+        unless another collection is asked for."""
+
+        preloaded = None
+
+        def load_collection(self):
+            if self.preloaded is None or self.args.collection.value \
+               or self.args['search-root'].value:
+                return super().load_collection()
+            module, parent = self.preloaded
+            self.config.set_project_location(parent)
+            self.config.load_project()
+            self.collection = Collection.from_module(
+                module, loaded_from=parent,
+                auto_dash_names=self.config.tasks.auto_dash_names)
+
+    return WarmProgram(name="Invoke", binary="inv[oke]",
+                       binary_names=["invoke", "inv"], version=__version__)
+
+
+def read_request(conn):
+    # read byte by byte so that the remaining data (the standard input of
+    # the task) stays in the socket for the child process
+    line = b''
+    while not line.endswith(b"\n"):
+        c = conn.recv(1)
+        if not c:
+            break
+        line += c
+    return json.loads(line.decode())
+
+
+class TaskServer(object):
+    """
+    The :cmd:`invd` of the project in `root_dir`.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = Path(root_dir).absolute()
+        self.preloaded = None
+        self.watched = {}
+
+    def load(self):
+        """Load the :xfile:`tasks.py` of the project and remember the
+        modification times of the files to watch."""
+        from invoke import FilesystemLoader
+        import atelier
+        os.chdir(str(self.root_dir))
+        loader = FilesystemLoader(start=str(self.root_dir))
+        module, parent = loader.load()
+        self.preloaded = (module, parent)
+        files = [Path(module.__file__)]
+        prj = atelier.current_project
+        if prj is not None and prj.main_package is not None:
+            files.append(
+                Path(prj.main_package.__file__).parent / 'setup_info.py')
+        self.watched = {fn: self.get_mtime(fn) for fn in files}
+
+    def get_mtime(self, fn):
+        try:
+            return fn.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get_changed_files(self):
+        """Return the names of the watched files that have changed since
+        :meth:`load`."""
+        return [str(fn) for fn, mtime in self.watched.items()
+                if self.get_mtime(fn) != mtime]
+
+    def reexec(self, sock, conn):
+        """Replace this process by a new daemon that handles `conn` (whose
+        request hasn't been read yet)."""
+        fds = (sock.fileno(), conn.fileno())
+        for fd in fds:
+            os.set_inheritable(fd, True)
+        os.environ[FDS_VARIABLE] = "{},{}".format(*fds)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.execv(sys.executable, [
+            sys.executable, '-m', 'atelier.taskd', str(self.root_dir)])
+
+    def reap(self):
+        """Collect all terminated child processes, including those started
+        by a daemon that has been replaced by this one."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+
+    def handle(self, sock, conn):
+        """Handle a request.  Return `False` when the daemon should stop."""
+        changed = self.get_changed_files()
+        if changed:
+            print("{} changed, reloading.".format(", ".join(changed)))
+            self.reexec(sock, conn)
+        try:
+            request = read_request(conn)
+        except (OSError, ValueError):
+            conn.close()
+            return True
+        name = request.get('query')
+        if name != 'run':
+            if name == 'ping':
+                answer = dict(pid=os.getpid(), root_dir=str(self.root_dir))
+            elif name == 'stop':
+                answer = dict()
+            else:
+                answer = dict(error="Unknown query {}".format(name))
+            try:
+                conn.sendall(json.dumps(answer).encode() + b"\n")
+            except OSError:
+                pass
+            conn.close()
+            return name != 'stop'
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                sock.close()
+                code = self.run_task(conn, request)
+            finally:
+                try:
+                    conn.sendall(TRAILER + "{}\n".format(code).encode())
+                finally:
+                    os._exit(0)
+        conn.close()
+        return True
+
+    def run_task(self, conn, request):
+        """Run :cmd:`inv` in a child process and return its exit code."""
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        fd = conn.fileno()
+        for i in (0, 1, 2):
+            os.dup2(fd, i)
+        os.environ.clear()
+        os.environ.update(request['env'])
+        os.chdir(request['cwd'])
+        program = make_program()
+        program.preloaded = self.preloaded
+        try:
+            program.run(['inv'] + request['argv'])
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        return code
+
+    def serve(self):
+        """Answer requests until a `stop` query comes in."""
+        fn = get_socket_file(self.root_dir)
+        pending = None
+        fds = os.environ.pop(FDS_VARIABLE, None)
+        if fds:
+            listen_fd, conn_fd = [int(i) for i in fds.split(',')]
+            sock = socket.socket(fileno=listen_fd)
+            pending = socket.socket(fileno=conn_fd)
+        else:
+            if query(self.root_dir, 'ping') is not None:
+                raise Exception("invd is already running for {}".format(
+                    self.root_dir))
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+            if os.path.exists(fn):
+                os.remove(fn)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            umask = os.umask(0o077)
+            try:
+                sock.bind(fn)
+            finally:
+                os.umask(umask)
+            sock.listen()
+        for s in (sock, pending):
+            if s is not None:
+                os.set_inheritable(s.fileno(), False)
+        self.load()
+        print("invd is serving {}, socket is {}".format(self.root_dir, fn))
+        sock.settimeout(1.0)
+        try:
+            running = True
+            if pending is not None:
+                running = self.handle(sock, pending)
+            while running:
+                self.reap()
+                try:
+                    conn, addr = sock.accept()
+                except socket.timeout:
+                    continue
+                conn.setblocking(True)
+                running = self.handle(sock, conn)
+        finally:
+            sock.close()
+            os.remove(fn)
+
+
+def serve(root_dir):
+    """
+    Run :cmd:`invd` for the project in `root_dir` until it receives a `stop`
+    query.
+    """
+    TaskServer(root_dir).serve()
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1])
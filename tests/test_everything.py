@@ -1,8 +1,16 @@
 # -*- coding: UTF-8 -*-
 
+import sys
+import time
+import subprocess
+from pathlib import Path
+
 from atelier import SETUP_INFO
 from atelier.test import TestCase
 
+INV_LIST_BUDGET = 2.0
+"""The maximum number of seconds `inv --list` may take in this project."""
+
 
 class BasicTests(TestCase):
 
@@ -19,6 +27,44 @@ class BasicTests(TestCase):
     def test_sheller(self):
         self.run_simple_doctests('atelier/sheller.py')
 
+    def test_runner(self):
+        self.run_simple_doctests('atelier/runner.py')
+
+    def test_history(self):
+        self.run_simple_doctests('atelier/history.py')
+
+    def test_profiler(self):
+        self.run_simple_doctests('atelier/profiler.py')
+
+    def test_taskd(self):
+        self.run_simple_doctests('atelier/taskd.py')
+
+    def test_doccache(self):
+        self.run_simple_doctests('atelier/invlib/doccache.py')
+
+    def test_daemon(self):
+        self.run_simple_doctests('atelier/daemon.py')
+
+    def test_setupreader(self):
+        self.run_simple_doctests('atelier/setupreader.py')
+
+    def test_projects(self):
+        self.run_simple_doctests('atelier/projects.py')
+
+
+class StartupTests(TestCase):
+
+    def test_inv_list(self):
+        root_dir = Path(__file__).parent.parent
+        timings = []
+        for i in range(3):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, '-m', 'invoke', '--list'],
+                           cwd=str(root_dir), stdout=subprocess.DEVNULL,
+                           check=True)
+            timings.append(time.perf_counter() - t0)
+        self.assertLess(min(timings), INV_LIST_BUDGET)
+
 
 class PackagesTests(TestCase):
     def test_packages(self):